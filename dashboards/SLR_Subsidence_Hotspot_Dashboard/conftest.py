@@ -0,0 +1 @@
+# Makes the local slr_hotspot package importable when running pytest from this folder
@@ -1,13 +1,8 @@
 import solara
-import rioxarray as rio
-import pandas as pd
-import geopandas as gpd
-import leafmap
-import matplotlib.pyplot as plt
-import matplotlib.colors as mcolors
-import matplotlib as mpl
 import os
-import matplotlib.cm as cm
+import pandas as pd
+import sys
+from concurrent.futures import CancelledError
 
 # Funcitons
 # Function to filter geodatabase by region name (e.g. Ghana)
@@ -16,18 +11,40 @@ def delta_filter(df, district_values):
     return df_dist
 
 # Data
-# RCP description, bounding boxes of deltas, metadata of subsidence stac collection 
+# RCP description and bounding boxes of deltas. The metadata of the subsidence stac collection is indexed in slr_hotspot.tiles
 # Get the directory where the current script is located
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_DIR = os.path.join(BASE_DIR, "data")
 
-rcp_df = pd.read_csv(os.path.join(DATA_DIR, "rcp_scenarios.csv"))
-bbox_gd = gpd.read_file(os.path.join(DATA_DIR, "Deltas.geojson"))
-gdf_stac = gpd.read_file(os.path.join(DATA_DIR, "stac_metadata.geojson"))
+# Make the local slr_hotspot package importable when started with `solara run`
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+from slr_hotspot.catalog import cached_stats, lookup
+from slr_hotspot.colormap import legend_png
+from slr_hotspot.ensemble import ensemble_hotspot_stats, uncertainty_band
+from slr_hotspot.export import FORMATS, MIME_TYPES, export_hotspot
+from slr_hotspot.histogram import index_path, indexed_hotspot_stats
+from slr_hotspot.jobs import JobGroup, shared_job
+from slr_hotspot.map import HotspotMap
+from slr_hotspot.mosaic import mosaic_url
+from slr_hotspot.polygons import hotspot_polygons
+from slr_hotspot.raster import hotspot_stats as raster_hotspot_stats
+from slr_hotspot.raster import RunningStats, approximate_stats, exact_allowed, raster_stats
+from slr_hotspot.reference_data import load_deltas, load_rcp_scenarios
+from slr_hotspot.sources import SCENARIOS_IPCC, SLR_BIN_WIDTH, SLR_ENSEMBLE, SLR_ENSEMBLES, SLR_RANGE, SUB_BIN_WIDTH, SUB_RANGE, TILER_URL, slr_url, sub_url
+from slr_hotspot.tiler import start_tile_server
+from slr_hotspot.tiles import delta_tiles, get_tile_index
+from slr_hotspot.timeseries import plot_timeseries, slr_timeseries
+from slr_hotspot.zonal import zonal_stats
+
+# Memory-mapped from the Arrow reference cache (see slr_hotspot.reference_data)
+rcp_df = load_rcp_scenarios()
+bbox_gd = load_deltas()
 
 # Static variables. 
 # This variable don't change during the dashboard execution
-scenarios_ipcc = ["1-26", "2-45", "5-85"]
+scenarios_ipcc = SCENARIOS_IPCC
 deltas = bbox_gd["Location"].unique().tolist()
 
 # Dynamic variables. 
@@ -42,6 +59,7 @@ slr_max = solara.reactive(0)
 slr_min = solara.reactive(0)
 sub_range = solara.reactive((0, 14)) # Subsidence
 sub_opacity = solara.reactive(100)
+export_format = solara.reactive("cog") # Hotspot download
 
 applied_state = solara.reactive({
 "delta": "Mekong Delta",
@@ -56,9 +74,228 @@ applied_state = solara.reactive({
 "slr_min": 0,
 })
 
+# Map instance kept across renders (see slr_hotspot.map.HotspotMap)
+map_instance = solara.reactive(None)
+# Polygon drawn by the user on the map (shapely, EPSG:4326)
+drawn_aoi = solara.reactive(None)
+# Optional local tile rendering of the COG layers (see slr_hotspot.tiler)
+tiler_url = start_tile_server() if TILER_URL == "local" else TILER_URL
+
+# Shown instead of the subsidence layer, statistics and download for deltas outside the tiles
+NO_SUB_TILES = "No subsidence tiles for this delta"
+
+# Statistics are computed in background jobs (see slr_hotspot.jobs).
+# Each panel has an exact job and an approximate job reading the COG overviews, shown until the exact
+# result arrives. Above SLR_HOTSPOT_EXACT_MAX_MPIXELS the exact pass is skipped (the job returns None).
+def hotspot_index(ranges):
+    # Histogram index over the full slider range, built once per (raster, delta)
+    return (SLR_RANGE, SLR_BIN_WIDTH) if ranges == "slr_range" else (SUB_RANGE, SUB_BIN_WIDTH)
+
+def is_cached(url, zone=None, value_range=None, ranges=None):
+    # True when the answer needs no raster read (catalog entry or histogram index on disk)
+    if lookup(url, zone, value_range) is not None:
+        return True
+    return ranges is not None and os.path.exists(index_path(url, zone, *hotspot_index(ranges)))
+
+def exact_stats(compute, cached, url, geometries=None, crs=None):
+    return compute() if cached or exact_allowed(url, geometries, crs) else None
+
+def global_stats(url):
+    # Precomputed catalog first, else a single block-streamed pass
+    return exact_stats(lambda: cached_stats(url, compute=lambda: raster_stats(url)), is_cached(url), url)
+
+def global_approx(url):
+    return None if is_cached(url) else approximate_stats(url)
+
+def hotspot_stats(url, zone, value_range, ranges):
+    gdf = delta_filter(bbox_gd, zone)
+    index_range, bin_width = hotspot_index(ranges)
+    compute = lambda: cached_stats(url, zone, value_range, compute=lambda: indexed_hotspot_stats(url, zone, gdf.geometry, gdf.crs, value_range, index_range, bin_width))
+    return exact_stats(compute, is_cached(url, zone, value_range, ranges), url, gdf.geometry, gdf.crs)
+
+def hotspot_approx(url, zone, value_range, ranges):
+    gdf = delta_filter(bbox_gd, zone)
+    return None if is_cached(url, zone, value_range, ranges) else approximate_stats(url, gdf.geometry, gdf.crs, value_range)
+
+def slr_ensemble_stats(scenario, year, zone, value_range):
+    gdf = delta_filter(bbox_gd, zone)
+
+    def compute():
+        # 5/50/95 ensemble members from the catalog; the missing ones are read together over one shared AOI window
+        stats = ensemble_hotspot_stats(scenario, year, zone, gdf.geometry, gdf.crs, value_range)
+        result = dict(stats[SLR_ENSEMBLE])
+        result["band"] = {name: uncertainty_band(stats, name) for name in ("max", "min", "mean")}
+        return result
+
+    cached = all(is_cached(slr_url(scenario, year, ensemble), zone, value_range, "slr_range") for ensemble in SLR_ENSEMBLES)
+    return exact_stats(compute, cached, slr_url(scenario, year), gdf.geometry, gdf.crs)
+
+def slr_ensemble_approx(scenario, year, zone, value_range):
+    # Median member only
+    return hotspot_approx(slr_url(scenario, year), zone, value_range, "slr_range")
+
+def drawn_aoi_stats(url, geometry, value_range):
+    # Window read over the polygon bounds; the mask is cached per grid and reused for other years/scenarios
+    return exact_stats(lambda: raster_hotspot_stats(url, [geometry], "EPSG:4326", value_range), False, url, [geometry], "EPSG:4326")
+
+def drawn_aoi_approx(url, geometry, value_range):
+    return approximate_stats(url, [geometry], "EPSG:4326", value_range)
+
+def drawn_aoi_sub_url(geometry):
+    tile_ids = get_tile_index().geometry_to_tiles(geometry)
+    return mosaic_url([sub_url(tile_id) for tile_id in tile_ids])
+
+def drawn_aoi_sub_stats(geometry, value_range):
+    url = drawn_aoi_sub_url(geometry)
+    return RunningStats().result() if url is None else drawn_aoi_stats(url, geometry, value_range)
+
+def drawn_aoi_sub_approx(geometry, value_range):
+    url = drawn_aoi_sub_url(geometry)
+    return None if url is None else drawn_aoi_approx(url, geometry, value_range)
+
+def hotspot_areas(url, zone, value_range):
+    # Vector hotspot areas at full resolution (cached per url, delta and range); the map simplifies them to its zoom
+    gdf = delta_filter(bbox_gd, zone)
+    return hotspot_polygons(url, zone, gdf.geometry, gdf.crs, value_range)
+
+def stats_snapshot(state):
+    # The part of the applied state the statistics depend on
+    return (state.get("delta"), state.get("slr_scenario"), state.get("slr_year"), tuple(state.get("slr_range")), tuple(state.get("sub_range")))
+
+def aoi_snapshot(state, aoi):
+    # The drawn polygon statistics also depend on the polygon
+    return stats_snapshot(state) + (aoi.wkb,)
+
+def show_stats(stats, var, unit):
+    # Ensemble statistics come with the 5-95 % range of the members
+    band = {name: f" ({low:.2f} - {high:.2f})" for name, (low, _, high) in stats.get("band", {}).items()}
+    solara.Markdown(f"**Max {var}**:\n  {stats['max']:.2f}{band.get('max', '')} [{unit}]")
+    solara.Markdown(f"**Min {var}**:\n   {stats['min']:.2f}{band.get('min', '')} [{unit}]")
+    solara.Markdown(f"**Mean {var}**:\n {stats['mean']:.2f}{band.get('mean', '')} [{unit}]")
+    if band:
+        solara.Markdown("*Median ensemble, 5 - 95 % ensemble range in brackets*")
+
+@solara.component
+def Statistics(job, var, unit, approx_job=None):
+    # Waits for the background jobs; new jobs (new applied state) replace the old results
+    result = solara.use_thread(lambda: job.result(), dependencies=[job], intrusive_cancel=False)
+    approx = solara.use_thread(lambda: approx_job.result() if approx_job is not None else None, dependencies=[approx_job], intrusive_cancel=False)
+    approx_stats = approx.value if approx.state == solara.ResultState.FINISHED else None
+    if result.state == solara.ResultState.FINISHED and result.value is not None:
+        show_stats(result.value, var, unit)
+    elif result.state == solara.ResultState.ERROR and not isinstance(result.error, CancelledError):
+        solara.Error(f"Error calculating {var} statistics: {result.error}")
+    elif approx_stats is not None:
+        # Overview-based answer until the exact pass finishes (or for good when it is skipped)
+        if result.state != solara.ResultState.FINISHED:
+            solara.ProgressLinear(True)
+        show_stats(approx_stats, var, unit)
+        note = "refining" if result.state != solara.ResultState.FINISHED else "exact pass skipped for this large area"
+        solara.Markdown(f"*Approximate (overview 1:{approx_stats['overview_factor']}), {note}*")
+    elif result.state == solara.ResultState.FINISHED and approx.state in (solara.ResultState.FINISHED, solara.ResultState.ERROR):
+        solara.Markdown(f"*No {var} statistics: exact pass skipped for this large area and no overviews available*")
+    else:
+        solara.ProgressLinear(True)
+        for label in ("Max", "Min", "Mean"):
+            solara.Markdown(f"**{label} {var}**:\n ... [{unit}]")
+
+@solara.component
+def HotspotAreas(job, var, layer_name):
+    # Total hotspot area in the statistics panel; the polygons go to the map as one GeoJSON layer
+    result = solara.use_thread(lambda: job.result(), dependencies=[job], intrusive_cancel=False)
+    areas = result.value if result.state == solara.ResultState.FINISHED else None
+
+    def sync_layer():
+        if map_instance.value is not None and result.state != solara.ResultState.RUNNING:
+            map_instance.value.sync_vector_layer(layer_name, areas, job)
+
+    solara.use_effect(sync_layer, dependencies=[job, result.state])
+    if areas is not None:
+        solara.Markdown(f"**{var} hotspot area**:\n {areas['area_km2'].sum():.1f} [km²] in {len(areas)} areas")
+    elif result.state == solara.ResultState.ERROR and not isinstance(result.error, CancelledError):
+        solara.Error(f"Error computing {var} hotspot areas: {result.error}")
+    else:
+        solara.Markdown(f"**{var} hotspot area**:\n ... [km²]")
+
+def compare_deltas(url_slr, slr_range, sub_range):
+    # One pass per raster over all deltas (see slr_hotspot.zonal).
+    # Run as a shared job: the table does not depend on the selected delta or the drawn area
+    zones = bbox_gd.set_index("Location")
+    sub_tiles = sorted({tile for zone in zones.index for tile in delta_tiles(delta_filter(bbox_gd, zone))[1]})
+    url_sub = mosaic_url([sub_url(tile) for tile in sub_tiles])
+    slr = zonal_stats(url_slr, zones, value_range=slr_range)
+    if url_sub is None:
+        sub = pd.DataFrame(float("nan"), index=zones.index, columns=["mean", "min", "max"])
+    else:
+        sub = zonal_stats(url_sub, zones, value_range=sub_range)
+    table = pd.DataFrame({
+        "Delta": zones.index,
+        "SLR mean [mm]": slr["mean"].round(2).values,
+        "SLR min [mm]": slr["min"].round(2).values,
+        "SLR max [mm]": slr["max"].round(2).values,
+        "Sub mean": sub["mean"].round(2).values,
+        "Sub min": sub["min"].round(2).values,
+        "Sub max": sub["max"].round(2).values,
+    })
+    return table
+
+def NoSubsidence():
+    solara.Markdown(f"*{NO_SUB_TILES}*")
+
+@solara.component
+def CompareDeltas(job):
+    result = solara.use_thread(lambda: job.result(), dependencies=[job], intrusive_cancel=False)
+    if result.state == solara.ResultState.FINISHED:
+        solara.DataFrame(result.value, items_per_page=len(result.value))
+    elif result.state == solara.ResultState.ERROR and not isinstance(result.error, CancelledError):
+        solara.Error(f"Error comparing deltas: {result.error}")
+    else:
+        solara.ProgressLinear(True)
+
+def timeseries_figure(scenario, zone, value_range):
+    gdf = delta_filter(bbox_gd, zone)
+    df = slr_timeseries(scenario, zone, gdf.geometry, gdf.crs, value_range)
+    return plot_timeseries(df, f"{zone} - SSP {scenario}")
+
+@solara.component
+def TimeSeries(job):
+    # All projection years are read concurrently in the background job
+    result = solara.use_thread(lambda: job.result(), dependencies=[job], intrusive_cancel=False)
+    if result.state == solara.ResultState.FINISHED:
+        solara.FigureMatplotlib(result.value)
+    elif result.state == solara.ResultState.ERROR and not isinstance(result.error, CancelledError):
+        solara.Error(f"Error calculating SLR time series: {result.error}")
+    else:
+        solara.ProgressLinear(True)
+
+def export_file(url, zone, value_range, fmt):
+    # Streamed to the cache folder on the first download, served from there afterwards
+    gdf = delta_filter(bbox_gd, zone)
+    with open(export_hotspot(url, zone, gdf.geometry, gdf.crs, value_range, fmt), "rb") as f:
+        return f.read()
+
+@solara.component
+def ExportHotspot(url, var, zone, value_range, name):
+    # The file is only written when the download is requested (in a solara worker thread)
+    fmt = export_format.value
+    solara.FileDownload(
+        lambda: export_file(url, zone, value_range, fmt),
+        filename=f"{name}{FORMATS[fmt]}",
+        label=f"Download {var} hotspot",
+        mime_type=MIME_TYPES[fmt],
+    )
+
 # Dashboard components are defined and called below
 @solara.component
 def Page():
+    # Background statistics jobs of this session; the drawn polygon jobs have their own
+    # group so drawing a polygon does not cancel and resubmit the delta statistics
+    jobs = solara.use_memo(JobGroup, dependencies=[])
+    aoi_jobs = solara.use_memo(JobGroup, dependencies=[])
+    def cancel_jobs():
+        jobs.cancel()
+        aoi_jobs.cancel()
+    solara.use_effect(lambda: cancel_jobs, dependencies=[])
 
     def Controls():
         solara.Markdown(r'''
@@ -99,104 +336,63 @@ def Page():
             solara.Button("Inspect Delta", on_click=update_gdf)
 
     def Map(): 
-        def load_stac_slr(Map, url, name_cog):
-            vmin = applied_state.value.get("slr_range")[0]
-            vmax = applied_state.value.get("slr_range")[1]
-            cmap = plt.get_cmap("viridis")  
-            norm = mcolors.Normalize(vmin=vmin, vmax=vmax)  
-            custom_cmap = {i: mcolors.to_hex(cmap(norm(i))) for i in range(vmin, vmax)}
+        def slr_layer(url, name_cog):
+            vmin, vmax = applied_state.value.get("slr_range")
             opacity_value = applied_state.value.get("slr_opacity")/100
-            Map.add_cog_layer(url, colormap=custom_cmap, name=name_cog, opacity=opacity_value, zoom_to_layer=False)
-            return Map
+            return {name_cog: {"url": url, "cmap": "viridis", "vmin": vmin, "vmax": vmax, "opacity": opacity_value}}
         
-        def load_stac_sub_list(Map, url_list):
-            vmin = applied_state.value.get("sub_range")[0] 
-            vmax = applied_state.value.get("sub_range")[1]
-            cmap = plt.get_cmap("YlOrRd")  
-            norm = mcolors.Normalize(vmin=vmin, vmax=vmax)
-            custom_cmap = {i: mcolors.to_hex(cmap(norm(i))) for i in range(vmin, vmax)}
+        def sub_layers(url_list, url_mosaic):
+            vmin, vmax = applied_state.value.get("sub_range")
             opacity_value = applied_state.value.get("sub_opacity")/100
-            for url in url_list:
-                Map.add_cog_layer(url, colormap=custom_cmap, name=url.split('B01_')[1], opacity=opacity_value, zoom_to_layer=False)
-            return Map
+            if url_mosaic is None:
+                return {}
+            if tiler_url:
+                # The local tiler reads the VRT mosaic directly: one layer for all tiles
+                return {"Subsidence": {"url": url_mosaic, "cmap": "YlOrRd", "vmin": vmin, "vmax": vmax, "opacity": opacity_value}}
+            return {url.split('B01_')[1]: {"url": url, "cmap": "YlOrRd", "vmin": vmin, "vmax": vmax, "opacity": opacity_value} for url in url_list}
 
         def load_gdf(Map, df, district_values):
             df_delta = df.loc[df["Location"].isin([district_values])]
-            Map.add_gdf(df_delta, layer_name="Deltas", style={"fillColor": "yellow", "color": "yellow", "weight": 3, "fillOpacity": 0.1})
-
-            # Convert to WGS84 and compute centroid
-            df_delta_4326 = df_delta.to_crs(epsg=4326)
-            centroid = df_delta_4326.geometry.centroid.iloc[0]
 
-            # Center and zoom the map (leafmap syntax)
-            Map.center = [centroid.y, centroid.x]
-            Map.zoom = 7
+            # Centroid in WGS84, precomputed in the reference cache
+            centroid = df_delta.iloc[0]
 
-            # Display the map
-            display(Map)
+            # Outline, center and zoom are only updated when the delta changed
+            Map.sync_delta(df_delta, district_values, [centroid["centroid_y"], centroid["centroid_x"]], zoom=7)
 
-        def get_sub_id(gdf):
+        def get_sub_id():
+            # Tile index lookup: tile under the delta centroid plus every tile the delta touches
             bbox_gdf_site = bbox_gd[bbox_gd['Location']==applied_state.value.get("delta")]
-            if gdf.crs != bbox_gdf_site.crs:
-                gdf = gdf.to_crs(bbox_gdf_site.crs)
-            centroids = bbox_gdf_site.geometry.centroid
-            selected_geometries = []
-            for centroid in centroids:
-                overlapping = gdf[gdf.geometry.intersects(centroid)]
-                selected_geometries.append(overlapping)
-            overlapping_geometries = gpd.GeoDataFrame(pd.concat(selected_geometries, ignore_index=True), crs=gdf.crs)
-            return overlapping_geometries['id'].values.tolist()[0]
+            return delta_tiles(bbox_gdf_site)
         
-        id = get_sub_id(gdf_stac)
+        id, sub_ids = get_sub_id()
 
-        url_sub = f'https://storage.googleapis.com/dgds-data-public/gca/SOTC/Haz-Land_Sub_2040_COGs/{id}.tif' 
-        url_slr = f'https://storage.googleapis.com/coclico-data-public/coclico/ar6_slr/ssp={applied_state.value.get("slr_scenario")}/slr_ens50.0/{str(applied_state.value.get("slr_year"))}.tif'
+        url_sub_list = [sub_url(tile_id) for tile_id in sub_ids]
+        # Deltas crossing a tile border are read through a virtual mosaic of all their tiles,
+        # deltas outside the tiles get None and no subsidence layer or statistics
+        try:
+            url_sub = mosaic_url(url_sub_list)
+        except Exception as e:
+            # Shown, not hidden: the subsidence layer and statistics then miss the other tiles
+            solara.Error(f"Error building the subsidence mosaic, showing tile {id} only: {e}")
+            url_sub = sub_url(id)
+        url_slr = slr_url(applied_state.value.get("slr_scenario"), applied_state.value.get("slr_year"))
         
-        Map_global = leafmap.Map(zoom_start=15)
-        Map_global = load_stac_slr(Map_global, url_slr, 'SLR')
-        Map_global = load_stac_sub_list(Map_global, [url_sub])
-        Map_global = load_gdf(Map_global, bbox_gd, applied_state.value.get("delta"))
+        # The map widget persists across renders; only changed layers are swapped
+        if map_instance.value is None:
+            map_instance.set(HotspotMap(tiler_url=tiler_url, zoom_start=15))
+            map_instance.value.on_aoi_change(drawn_aoi.set)
+        Map_global = map_instance.value
+        Map_global.sync_cog_layers({**slr_layer(url_slr, 'SLR'), **sub_layers(url_sub_list, url_sub)})
+        load_gdf(Map_global, bbox_gd, applied_state.value.get("delta"))
+        solara.display(Map_global)
         
-        return url_slr, url_sub, id
+        return url_slr, url_sub, id, sub_ids
     
-    def Statistics(url, var, ranges, unit, full):
-        def calculate_mean(url):
-            item = rio.open_rasterio(url)
-            mean_value = item.mean().item()
-            max_value = item.max().item()
-            min_value = item.min().item()
-            return mean_value, max_value, min_value
-        
-        def calculate_mean_clipped(url, ranges):
-            item = rio.open_rasterio(url)
-            item = item.where((item >= applied_state.value.get(ranges)[0]) & (item <= applied_state.value.get(ranges)[1]))
-            gdf = bbox_gd.loc[bbox_gd["Location"].isin([applied_state.value.get("delta")])]  
-            item = item.rio.clip(gdf.geometry, gdf.crs, drop=True)
-            item = item.where(item <= 200) #TODO: This is a hardcoded threshold. This will not be needed when having global coverage in subsidence data
-            mean_value = item.mean().item()
-            max_value = item.max().item()
-            min_value = item.min().item()
-            return mean_value, max_value, min_value
-        
-        if full == True:
-            mean, max, min = calculate_mean(url)
-        else:
-            mean, max, min = calculate_mean_clipped(url, ranges)
-
-        solara.Markdown(f"**Max {var}**:\n  {max:.2f} [{unit}]")
-        solara.Markdown(f"**Min {var}**:\n   {min:.2f} [{unit}]")
-        solara.Markdown(f"**Mean {var}**:\n {mean:.2f} [{unit}]")
-
     def Scale(title, ranges, cmap):
-        fig, ax = plt.subplots(figsize=(6, 1))
-        fig.subplots_adjust(bottom=0.5)
-
-        norm = mpl.colors.Normalize(vmin=applied_state.value.get(ranges)[0], vmax=applied_state.value.get(ranges)[1])
-
-        cb = mpl.colorbar.ColorbarBase(ax, cmap=cmap, norm=norm, orientation='horizontal')
-        cb.set_label(title)
-
-        return plt.show()
+        # Legend PNG is rendered once per (cmap, range) and cached
+        vmin, vmax = applied_state.value.get(ranges)
+        solara.Image(legend_png(cmap, vmin, vmax, title))
 
     # Below all the components are called to create the dashboard
     # This component will create the sidebar of the dashboard. This part is static and does not refresh with changes in the sidebar
@@ -208,14 +404,51 @@ def Page():
     with solara.Columns([1, 0.5, 0.5]):  
         # This component will display the map and its labels
         with solara.Column():   
-            url_slr, url_sub, id = Map()
+            url_slr, url_sub, id, sub_ids = Map()
+
+            # Start the four statistics concurrently; jobs of a previous applied state are cancelled
+            state = applied_state.value
+            aoi = drawn_aoi.value
+            snapshot = stats_snapshot(state)
+            def submit(name, func, *args):
+                return jobs.submit(snapshot, name, func, *args)
+            def submit_approx(name, func, *args):
+                # Own pool: the overview answers do not wait for the exact reads
+                return jobs.submit(snapshot, name, func, *args, approx=True)
+
+            slr_range, sub_range, zone = tuple(state.get("slr_range")), tuple(state.get("sub_range")), state.get("delta")
+            scenario, year = state.get("slr_scenario"), state.get("slr_year")
+            stats_jobs = {
+                # Whole-dataset statistics depend on the URL only: shared across deltas, ranges and sessions
+                "slr_global": shared_job(("global", url_slr), global_stats, url_slr),
+                "slr_global_approx": shared_job(("global_approx", url_slr), global_approx, url_slr, approx=True),
+                "slr_hotspot": submit("slr_hotspot", slr_ensemble_stats, scenario, year, zone, slr_range),
+                "slr_hotspot_approx": submit_approx("slr_hotspot_approx", slr_ensemble_approx, scenario, year, zone, slr_range),
+                "slr_areas": submit("slr_areas", hotspot_areas, url_slr, zone, slr_range),
+                "compare": shared_job(("compare", url_slr, slr_range, sub_range), compare_deltas, url_slr, slr_range, sub_range),
+                "slr_timeseries": submit("slr_timeseries", timeseries_figure, scenario, zone, slr_range),
+            }
+            if url_sub is not None:
+                stats_jobs["sub_global"] = shared_job(("global", url_sub), global_stats, url_sub)
+                stats_jobs["sub_global_approx"] = shared_job(("global_approx", url_sub), global_approx, url_sub, approx=True)
+                stats_jobs["sub_hotspot"] = submit("sub_hotspot", hotspot_stats, url_sub, zone, sub_range, "sub_range")
+                stats_jobs["sub_hotspot_approx"] = submit_approx("sub_hotspot_approx", hotspot_approx, url_sub, zone, sub_range, "sub_range")
+                stats_jobs["sub_areas"] = submit("sub_areas", hotspot_areas, url_sub, zone, sub_range)
+            if aoi is not None:
+                aoi_state = aoi_snapshot(state, aoi)
+                stats_jobs["aoi_slr"] = aoi_jobs.submit(aoi_state, "aoi_slr", drawn_aoi_stats, url_slr, aoi, slr_range)
+                stats_jobs["aoi_slr_approx"] = aoi_jobs.submit(aoi_state, "aoi_slr_approx", drawn_aoi_approx, url_slr, aoi, slr_range, approx=True)
+                stats_jobs["aoi_sub"] = aoi_jobs.submit(aoi_state, "aoi_sub", drawn_aoi_sub_stats, aoi, sub_range)
+                stats_jobs["aoi_sub_approx"] = aoi_jobs.submit(aoi_state, "aoi_sub_approx", drawn_aoi_sub_approx, aoi, sub_range, approx=True)
+            else:
+                aoi_jobs.cancel()
             
             with solara.Columns([1, 1]):  
                 with solara.Column():   
-                    Scale('SLR', 'slr_range', cm.viridis)
+                    Scale('SLR', 'slr_range', "viridis")
 
                 with solara.Column():  
-                    Scale('Subsidence', 'sub_range', cm.YlOrRd)
+                    Scale('Subsidence', 'sub_range', "YlOrRd")
 
         # This component will display the data statistics
         with solara.Column():    
@@ -223,24 +456,61 @@ def Page():
             solara.Markdown(r'''#### Global statistics''')
             with solara.Columns([0.6, 0.6]):  
                 with solara.Column():   
-                    Statistics(url_slr, 'SLR', 'slr_range', "mm", full=True)
+                    Statistics(stats_jobs["slr_global"], 'SLR', "mm", stats_jobs["slr_global_approx"])
                 with solara.Column():  
-                    Statistics(url_sub, "Sub", "sub_range", "1", full=True)
+                    if url_sub is None:
+                        NoSubsidence()
+                    else:
+                        Statistics(stats_jobs["sub_global"], "Sub", "1", stats_jobs["sub_global_approx"])
 
             solara.Markdown(r'''#### Hotspot''')
             with solara.Columns([0.6, 0.6]):  
                 with solara.Column():   
-                    Statistics(url_slr, 'SLR', 'slr_range', "mm", full=False)
+                    Statistics(stats_jobs["slr_hotspot"], 'SLR', "mm", stats_jobs["slr_hotspot_approx"])
+                    HotspotAreas(stats_jobs["slr_areas"], "SLR", "SLR hotspots")
 
                 with solara.Column():  
-                    Statistics(url_sub, "Sub", "sub_range", "1", full=False)
+                    if url_sub is None:
+                        NoSubsidence()
+                    else:
+                        Statistics(stats_jobs["sub_hotspot"], "Sub", "1", stats_jobs["sub_hotspot_approx"])
+                        HotspotAreas(stats_jobs["sub_areas"], "Sub", "Sub hotspots")
+
+            solara.Markdown(r'''#### Drawn area (hotspot)''')
+            if aoi is None:
+                solara.Markdown("Draw a polygon on the map to get the statistics of that area.")
+            else:
+                with solara.Columns([0.6, 0.6]):  
+                    with solara.Column():   
+                        Statistics(stats_jobs["aoi_slr"], 'SLR', "mm", stats_jobs["aoi_slr_approx"])
+                    with solara.Column():  
+                        Statistics(stats_jobs["aoi_sub"], "Sub", "1", stats_jobs["aoi_sub_approx"])
+
+            solara.Markdown(r'''#### SLR time series (hotspot)''')
+            TimeSeries(stats_jobs["slr_timeseries"])
+
+            solara.Markdown(r'''#### Compare all deltas (hotspot)''')
+            CompareDeltas(stats_jobs["compare"])
+
+            solara.Markdown(r'''#### Export hotspot''')
+            solara.Select(label="File format", value=export_format, values=list(FORMATS))
+            name = f"{zone.replace(' ', '_')}_hotspot"
+            with solara.Row():
+                ExportHotspot(url_slr, "SLR", zone, slr_range, f"{name}_slr_ssp{scenario}_{year}_{slr_range[0]}_{slr_range[1]}")
+                if url_sub is not None:
+                    ExportHotspot(url_sub, "Sub", zone, sub_range, f"{name}_sub_{sub_range[0]}_{sub_range[1]}")
 
         # This component will display the metadata of the data
         with solara.Column():   
             solara.Markdown(r'''# Metadata''')
             solara.Markdown(r'''#### Subsidence''')
-            solara.Markdown(f"**Subsidence ID**: {id}")
-            solara.Markdown(f"**Subsidence URL**: {url_sub}")
+            if url_sub is None:
+                NoSubsidence()
+            else:
+                solara.Markdown(f"**Subsidence ID**: {id}")
+                if len(sub_ids) > 1:
+                    solara.Markdown(f"**Subsidence tiles covering the delta**: {', '.join(sub_ids)}")
+                solara.Markdown(f"**Subsidence URL**: {url_sub}")
             solara.Markdown(r'''#### SLR''')
             solara.Markdown(f"**SLR URL**: {url_slr}")
             solara.Markdown(f"**Scenario**: {applied_state.value.get('slr_scenario')}")
@@ -0,0 +1,41 @@
+"""
+Writing files under the cache folder from several threads.
+
+Dashboard renders, background jobs and the tile server can produce the same
+cache file at the same time. Builders of one file are serialized with a lock
+per path, and files are written under a unique temporary name next to the
+target and moved into place, so a reader never sees a partial file.
+"""
+import contextlib
+import os
+import tempfile
+import threading
+
+_PATH_LOCKS = {}
+_LOCK = threading.Lock()
+
+
+def path_lock(path):
+    """Lock of the builders of the cache file at `path` (one per path and process)."""
+    with _LOCK:
+        return _PATH_LOCKS.setdefault(path, threading.Lock())
+
+
+@contextlib.contextmanager
+def atomic_path(path, suffix=""):
+    """
+    Unique temporary path next to `path`, moved to `path` when the block
+    succeeds and removed when it fails. `suffix` keeps the file extension for
+    writers that choose the format from it.
+    """
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=os.path.basename(path) + ".", suffix=".tmp" + suffix)
+    os.close(fd)
+    try:
+        yield tmp_path
+        os.replace(tmp_path, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(tmp_path)
+        raise
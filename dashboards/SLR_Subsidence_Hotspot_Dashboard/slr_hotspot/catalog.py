@@ -0,0 +1,218 @@
+"""
+Precomputed statistics catalog for the SLR and subsidence COGs.
+
+A batch job computes the global and per-delta statistics for every SLR
+scenario/year and every subsidence tile (or tile mosaic, see
+slr_hotspot.mosaic) used by the dashboard and stores them in a Parquet table.
+The dashboard reads the table first and only computes statistics live when an
+entry is missing or stale.
+
+Build or refresh the catalog from the dashboard folder with:
+
+    python -m slr_hotspot.catalog --workers 8
+"""
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+import requests
+
+from slr_hotspot.cache import atomic_path
+from slr_hotspot.mosaic import mosaic_url
+from slr_hotspot.raster import hotspot_stats, raster_stats
+from slr_hotspot.reference_data import load_deltas
+from slr_hotspot.sources import (
+    CACHE_DIR,
+    SCENARIOS_IPCC,
+    SLR_ENSEMBLES,
+    SLR_RANGE,
+    SLR_YEARS,
+    SUB_RANGE,
+    slr_url,
+    sub_url,
+)
+from slr_hotspot.tiles import delta_tiles
+
+CATALOG_FILE = os.path.join(CACHE_DIR, "stats_catalog.parquet")
+# Entries older than this are considered stale and recomputed live
+MAX_AGE = timedelta(days=int(os.getenv("STATS_CATALOG_MAX_AGE_DAYS", "30")))
+
+# Zone name used for global (unclipped) statistics
+GLOBAL_ZONE = ""
+STAT_COLUMNS = ["count", "mean", "min", "max", "std"]
+COLUMNS = ["url", "zone", "vmin", "vmax"] + STAT_COLUMNS + ["etag", "computed_at"]
+
+_CATALOG = None
+_CATALOG_MTIME = None
+
+
+def _key(url, zone, value_range):
+    vmin, vmax = value_range if value_range is not None else (None, None)
+    return (
+        url,
+        zone or GLOBAL_ZONE,
+        None if vmin is None else float(vmin),
+        None if vmax is None else float(vmax),
+    )
+
+
+def _index(df):
+    """Turn the catalog table into a dict keyed by (url, zone, vmin, vmax); global rows have no range."""
+    index = {}
+    for row in df.to_dict("records"):
+        value_range = None if pd.isna(row["vmin"]) else (row["vmin"], row["vmax"])
+        index[_key(row["url"], row["zone"], value_range)] = row
+    return index
+
+
+def _read_catalog():
+    if not os.path.exists(CATALOG_FILE):
+        return {}
+    return _index(pd.read_parquet(CATALOG_FILE))
+
+
+def _is_expired(row):
+    return datetime.now(timezone.utc) - pd.Timestamp(row["computed_at"]) > MAX_AGE
+
+
+def load_catalog():
+    """Return the catalog as a dict of rows, re-reading it when the file changed."""
+    global _CATALOG, _CATALOG_MTIME
+    if not os.path.exists(CATALOG_FILE):
+        return {}
+    mtime = os.path.getmtime(CATALOG_FILE)
+    if _CATALOG is None or mtime != _CATALOG_MTIME:
+        _CATALOG = _read_catalog()
+        _CATALOG_MTIME = mtime
+    return _CATALOG
+
+
+def lookup(url, zone=None, value_range=None):
+    """
+    Precomputed statistics for a raster, optionally clipped to a zone and value range.
+
+    Returns a dict like raster_stats, or None when the entry is missing or stale.
+    """
+    row = load_catalog().get(_key(url, zone, value_range))
+    if row is None or _is_expired(row):
+        return None
+    return {col: row[col] for col in STAT_COLUMNS}
+
+
+def cached_stats(url, zone=None, value_range=None, compute=None):
+    """Statistics from the catalog, falling back to `compute()` when missing or stale."""
+    stats = lookup(url, zone, value_range)
+    if stats is None:
+        stats = compute()
+    return stats
+
+
+def get_etag(url):
+    """ETag (or Last-Modified) of a remote file, used to detect changed sources."""
+    if not url.startswith("http"):
+        return str(os.path.getmtime(url))
+    try:
+        response = requests.head(url, timeout=30, allow_redirects=True)
+        return response.headers.get("ETag") or response.headers.get("Last-Modified")
+    except requests.RequestException as e:
+        print(f"Error getting ETag for {url}: {e}")
+        return None
+
+
+def compute_entry(url, zone, value_range):
+    """Compute one catalog row (runs in a worker process)."""
+    if zone:
+        deltas = load_deltas()
+        gdf = deltas.loc[deltas["Location"] == zone]
+        stats = hotspot_stats(url, gdf.geometry, gdf.crs, value_range)
+    else:
+        stats = raster_stats(url)
+    url, zone, vmin, vmax = _key(url, zone, value_range)
+    return {
+        "url": url,
+        "zone": zone,
+        "vmin": vmin,
+        "vmax": vmax,
+        **{col: stats[col] for col in STAT_COLUMNS},
+        "etag": get_etag(url),
+        "computed_at": datetime.now(timezone.utc),
+    }
+
+
+def sub_mosaic_url(zone):
+    """Subsidence dataset of a delta: its single tile, the mosaic of all tiles it touches, or None without tiles."""
+    deltas = load_deltas()
+    _, tile_ids = delta_tiles(deltas.loc[deltas["Location"] == zone])
+    return mosaic_url([sub_url(tile_id) for tile_id in tile_ids])
+
+
+def catalog_entries():
+    """
+    All (url, zone, value_range) combinations offered by the dashboard.
+
+    Per delta all SLR ensemble members are cataloged (the hotspot panel shows
+    their 5-95 % band); global statistics only for the median.
+    """
+    zones = load_deltas()["Location"].unique().tolist()
+    entries = []
+    for scenario in SCENARIOS_IPCC:
+        for year in SLR_YEARS:
+            entries.append((slr_url(scenario, year), GLOBAL_ZONE, None))
+            for ensemble in SLR_ENSEMBLES:
+                url = slr_url(scenario, year, ensemble)
+                entries += [(url, zone, SLR_RANGE) for zone in zones]
+    for zone in zones:
+        url = sub_mosaic_url(zone)
+        if url is not None:
+            entries += [(url, GLOBAL_ZONE, None), (url, zone, SUB_RANGE)]
+    # Several deltas can share a subsidence tile
+    return list(dict.fromkeys(entries))
+
+
+def _needs_update(entry, existing, refresh):
+    """True when an entry is missing, expired or (with `refresh`) its source changed."""
+    row = existing.get(_key(*entry))
+    if row is None or _is_expired(row):
+        return True
+    return refresh and get_etag(entry[0]) != row["etag"]
+
+
+def build_catalog(workers=None, refresh=False):
+    """
+    Compute missing or stale catalog entries in a process pool and write the table.
+
+    With `refresh` also entries whose source ETag changed are recomputed.
+    """
+    existing = _read_catalog()
+    todo = [entry for entry in catalog_entries() if _needs_update(entry, existing, refresh)]
+    print(f"Computing {len(todo)} catalog entries...")
+
+    rows = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(compute_entry, *entry): entry for entry in todo}
+        for i, future in enumerate(as_completed(futures), 1):
+            try:
+                rows.append(future.result())
+            except Exception as e:
+                print(f"Error computing statistics for {futures[future]}: {e}")
+            if i % 10 == 0:
+                print(f"Computed {i}/{len(todo)} entries...")
+
+    for row in rows:
+        value_range = None if row["vmin"] is None else (row["vmin"], row["vmax"])
+        existing[_key(row["url"], row["zone"], value_range)] = row
+    table = pd.DataFrame(list(existing.values()), columns=COLUMNS)
+    table["computed_at"] = pd.to_datetime(table["computed_at"], utc=True)
+    with atomic_path(CATALOG_FILE, suffix=".parquet") as tmp_file:
+        table.to_parquet(tmp_file, index=False)
+    print(f"Catalog with {len(table)} entries written to {CATALOG_FILE}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompute the SLR/subsidence statistics catalog.")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes (default: all cores)")
+    parser.add_argument("--refresh", action="store_true", help="Also recompute entries whose source file changed")
+    args = parser.parse_args()
+    build_catalog(workers=args.workers, refresh=args.refresh)
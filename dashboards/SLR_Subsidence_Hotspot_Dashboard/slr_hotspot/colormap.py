@@ -0,0 +1,67 @@
+"""
+Cached colormap lookup tables and legend images for the COG layers.
+
+The hex tables (for add_cog_layer), RGBA tables (for the local tiler) and
+legends are keyed by colormap name and range and memoized with LRU eviction, so
+re-rendering the dashboard with unchanged ranges does no matplotlib work.
+"""
+import io
+from functools import lru_cache
+
+import numpy as np
+from matplotlib import colormaps
+from matplotlib.colorbar import ColorbarBase
+from matplotlib.colors import Normalize
+from matplotlib.figure import Figure
+
+CACHE_SIZE = 64
+_HEX_DIGITS = np.array(list("0123456789abcdef"))
+
+
+def _to_hex(rgba):
+    """Vectorized matplotlib.colors.to_hex for an (n, 4) array of RGBA floats."""
+    rgb = np.round(rgba[:, :3] * 255).astype(np.uint8)
+    chars = np.empty((rgb.shape[0], 7), dtype="<U1")
+    chars[:, 0] = "#"
+    chars[:, 1::2] = _HEX_DIGITS[rgb >> 4]
+    chars[:, 2::2] = _HEX_DIGITS[rgb & 15]
+    return chars.view("<U7").ravel()
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _hex_lut(cmap_name, vmin, vmax):
+    values = np.arange(vmin, vmax)
+    rgba = colormaps[cmap_name](Normalize(vmin=vmin, vmax=vmax)(values))
+    return tuple(zip(values.tolist(), _to_hex(np.atleast_2d(rgba)).tolist()))
+
+
+def hex_lut(cmap_name, vmin, vmax):
+    """
+    Colormap {value: '#rrggbb'} for the integer values in [vmin, vmax).
+
+    Same result as {i: to_hex(cmap(norm(i))) for i in range(vmin, vmax)}, built
+    with one vectorized call. A new dict is returned so callers may modify it.
+    """
+    return dict(_hex_lut(cmap_name, int(vmin), int(vmax)))
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def rgba_lut(cmap_name, size=256):
+    """(size, 4) uint8 RGBA table of a colormap, indexed by the value scaled to 0..size-1."""
+    lut = np.round(colormaps[cmap_name](np.linspace(0, 1, size)) * 255).astype(np.uint8)
+    lut.setflags(write=False)
+    return lut
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def legend_png(cmap_name, vmin, vmax, title):
+    """PNG bytes of a horizontal colorbar for a colormap and range, rendered once."""
+    # A bare Figure (no pyplot) keeps rendering thread safe and outside the notebook output
+    fig = Figure(figsize=(6, 1))
+    ax = fig.add_subplot()
+    fig.subplots_adjust(bottom=0.5)
+    cb = ColorbarBase(ax, cmap=colormaps[cmap_name], norm=Normalize(vmin=vmin, vmax=vmax), orientation="horizontal")
+    cb.set_label(title)
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png")
+    return buffer.getvalue()
@@ -0,0 +1,218 @@
+"""
+Local chunked Zarr datacube of the AR6 sea level rise projections.
+
+The per-year SLR COGs of all scenarios and ensemble members are packed into one
+array with dimensions (scenario, ensemble, year, y, x). A chunk holds all
+years of one scenario/ensemble for a CHUNK_SIZE x CHUNK_SIZE pixel block, so
+
+- the time series of a point is a single chunk read,
+- the time series of a delta reads only the few chunks under its window,
+- a spatial window of one year reads the same chunks (all years are small
+  compared to the spatial extent).
+
+zarr is an optional dependency: without it, or without an ingested cube, the
+dashboard keeps reading the COGs.
+
+Ingest (optionally limited to a lon/lat box) from the dashboard folder with:
+
+    python -m slr_hotspot.datacube ingest --bounds 100 5 110 15
+    python -m slr_hotspot.datacube info
+"""
+import argparse
+import math
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import rasterio
+from affine import Affine
+from rasterio.crs import CRS
+from rasterio.warp import transform, transform_bounds
+from rasterio.windows import Window, from_bounds
+from rasterio.windows import transform as window_transform
+
+from slr_hotspot.raster import GDAL_ENV, MAX_WORKERS, RunningStats, aoi_window
+from slr_hotspot.sources import CACHE_DIR, SANITY_THRESHOLD, SCENARIOS_IPCC, SLR_ENSEMBLE, SLR_ENSEMBLES, SLR_YEARS, slr_url
+
+CUBE_PATH = os.path.join(CACHE_DIR, "slr_datacube.zarr")
+CHUNK_SIZE = 128
+
+_CUBE = None
+
+
+def _require_zarr():
+    try:
+        import zarr
+    except ImportError as e:
+        raise ImportError("The SLR datacube needs the optional zarr package (pip install zarr)") from e
+    return zarr
+
+
+def _read_year(url, window):
+    """One year of the ingest window as float32 with NaN for nodata."""
+    with rasterio.Env(**GDAL_ENV), rasterio.open(url) as src:
+        data = src.read(1, window=window).astype(np.float32)
+        if src.nodata is not None and not np.isnan(src.nodata):
+            data[data == src.nodata] = np.nan
+    return data
+
+
+def ingest(scenarios=SCENARIOS_IPCC, ensembles=SLR_ENSEMBLES, years=SLR_YEARS, bounds=None, path=CUBE_PATH, max_workers=MAX_WORKERS):
+    """
+    Pack the SLR COGs into a Zarr datacube at `path`.
+
+    `bounds` (lon/lat minx, miny, maxx, maxy) limits the cube to a region;
+    by default the full rasters are ingested. Rasters are read per strip of
+    CHUNK_SIZE rows, with all years of a strip fetched concurrently.
+    """
+    zarr = _require_zarr()
+    scenarios, ensembles, years = list(scenarios), list(ensembles), list(years)
+    with rasterio.Env(**GDAL_ENV), rasterio.open(slr_url(scenarios[0], years[0], ensembles[0])) as src:
+        crs = src.crs
+        window = Window(0, 0, src.width, src.height)
+        if bounds is not None:
+            region = from_bounds(*transform_bounds("EPSG:4326", crs, *bounds), transform=src.transform)
+            # Round outward so partial edge pixels are kept, then clip to the raster.
+            col_off, row_off = math.floor(region.col_off), math.floor(region.row_off)
+            col_end = math.ceil(region.col_off + region.width)
+            row_end = math.ceil(region.row_off + region.height)
+            window = Window(col_off, row_off, col_end - col_off, row_end - row_off).intersection(window)
+            window = Window(int(window.col_off), int(window.row_off), int(window.width), int(window.height))
+        cube_transform = src.window_transform(window)
+
+    tmp_path = path + ".tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    cube = zarr.open_array(
+        tmp_path,
+        mode="w",
+        shape=(len(scenarios), len(ensembles), len(years), window.height, window.width),
+        chunks=(1, 1, len(years), CHUNK_SIZE, CHUNK_SIZE),
+        dtype="float32",
+        fill_value=np.nan,
+    )
+    cube.attrs.update({
+        "scenarios": scenarios,
+        "ensembles": ensembles,
+        "years": years,
+        "crs": crs.to_wkt(),
+        "transform": list(cube_transform)[:6],
+    })
+
+    with ThreadPoolExecutor(max_workers=max(max_workers, len(years))) as pool:
+        for s, scenario in enumerate(scenarios):
+            for e, ensemble in enumerate(ensembles):
+                urls = [slr_url(scenario, year, ensemble) for year in years]
+                for row in range(0, window.height, CHUNK_SIZE):
+                    rows = min(CHUNK_SIZE, window.height - row)
+                    strip = Window(window.col_off, window.row_off + row, window.width, rows)
+                    cube[s, e, :, row:row + rows, :] = np.stack(list(pool.map(lambda url: _read_year(url, strip), urls)))
+                print(f"Ingested ssp={scenario} ens={ensemble}")
+
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_path, path)
+
+
+class SLRDatacube:
+    """Reader of an ingested SLR datacube."""
+
+    def __init__(self, path=CUBE_PATH):
+        zarr = _require_zarr()
+        self.array = zarr.open_array(path, mode="r")
+        attrs = self.array.attrs
+        self.scenarios = list(attrs["scenarios"])
+        self.ensembles = list(attrs["ensembles"])
+        self.years = list(attrs["years"])
+        self.crs = CRS.from_wkt(attrs["crs"])
+        self.transform = Affine(*attrs["transform"])
+        self.height, self.width = self.array.shape[-2:]
+
+    @property
+    def bounds(self):
+        left, top = self.transform * (0, 0)
+        right, bottom = self.transform * (self.width, self.height)
+        return min(left, right), min(top, bottom), max(left, right), max(top, bottom)
+
+    def window_transform(self, window):
+        return window_transform(window, self.transform)
+
+    def covers(self, scenario, ensemble=SLR_ENSEMBLE, geometries=None, crs=None):
+        """True when the cube holds the scenario/ensemble and the full extent of `geometries`."""
+        if scenario not in self.scenarios or ensemble not in self.ensembles:
+            return False
+        if geometries is None:
+            return True
+        minx, miny, maxx, maxy = transform_bounds(crs, self.crs, *geometries.total_bounds)
+        left, bottom, right, top = self.bounds
+        return minx >= left and maxx <= right and miny >= bottom and maxy <= top
+
+    def _indices(self, scenario, ensemble):
+        return self.scenarios.index(scenario), self.ensembles.index(ensemble)
+
+    def read_window(self, scenario, year, window, ensemble=SLR_ENSEMBLE):
+        """One year of a pixel window (NaN = no data)."""
+        s, e = self._indices(scenario, ensemble)
+        rows, cols = window.toslices()
+        return self.array[s, e, self.years.index(year), rows, cols]
+
+    def point_timeseries(self, lon, lat, scenario, ensemble=SLR_ENSEMBLE):
+        """SLR of one location for all years (a single chunk read)."""
+        s, e = self._indices(scenario, ensemble)
+        (x,), (y,) = transform("EPSG:4326", self.crs, [lon], [lat])
+        col, row = ~self.transform * (x, y)
+        row, col = math.floor(row), math.floor(col)
+        if not (0 <= row < self.height and 0 <= col < self.width):
+            raise ValueError(f"Point ({lon}, {lat}) is outside the datacube")
+        return pd.Series(self.array[s, e, :, row, col], index=pd.Index(self.years, name="year"), name="slr")
+
+    def aoi_timeseries(self, scenario, geometries, crs, value_range=None, ensemble=SLR_ENSEMBLE, threshold=SANITY_THRESHOLD):
+        """
+        Hotspot statistics of an AOI for every year, from the chunks under its window.
+
+        Returns a DataFrame indexed by year with the raster_stats columns.
+        """
+        s, e = self._indices(scenario, ensemble)
+        window, mask = aoi_window(self, geometries, crs)
+        rows = []
+        if window is None:
+            rows = [RunningStats().result() for _ in self.years]
+        else:
+            row_slice, col_slice = window.toslices()
+            block = self.array[s, e, :, row_slice, col_slice]
+            keep = mask & ~np.isnan(block) & (block <= threshold)
+            if value_range is not None:
+                keep &= (block >= value_range[0]) & (block <= value_range[1])
+            for i in range(len(self.years)):
+                stats = RunningStats()
+                stats.update(block[i][keep[i]])
+                rows.append(stats.result())
+        return pd.DataFrame(rows, index=pd.Index(self.years, name="year"))
+
+
+def open_datacube(path=CUBE_PATH):
+    """The ingested datacube, or None when zarr is not installed or nothing was ingested."""
+    global _CUBE
+    if _CUBE is None and os.path.exists(path):
+        try:
+            _CUBE = SLRDatacube(path)
+        except ImportError as e:
+            print(f"Error opening SLR datacube: {e}")
+    return _CUBE
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or inspect the SLR Zarr datacube.")
+    parser.add_argument("command", choices=["ingest", "info"])
+    parser.add_argument("--bounds", type=float, nargs=4, metavar=("MINX", "MINY", "MAXX", "MAXY"), help="lon/lat region to ingest")
+    parser.add_argument("--scenarios", nargs="+", default=SCENARIOS_IPCC)
+    parser.add_argument("--ensembles", nargs="+", default=SLR_ENSEMBLES)
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS)
+    args = parser.parse_args()
+    if args.command == "ingest":
+        ingest(args.scenarios, args.ensembles, bounds=args.bounds, max_workers=args.workers)
+    cube = open_datacube()
+    if cube is None:
+        print(f"No datacube at {CUBE_PATH}")
+    else:
+        print(f"{CUBE_PATH}: shape {cube.array.shape}, chunks {cube.array.chunks}, bounds {cube.bounds}")
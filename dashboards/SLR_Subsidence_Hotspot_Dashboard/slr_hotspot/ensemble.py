@@ -0,0 +1,29 @@
+"""
+Hotspot statistics of the SLR ensemble members (5th, 50th and 95th percentile).
+
+Members found in the statistics catalog (full slider range, see
+catalog.catalog_entries) are served from it. The histogram indexes of the
+other members are built together, since the members of a scenario and year
+share their grid: one AOI window and mask, with the blocks of all members read
+concurrently (see histogram.build_indexes). Slider changes are then answered
+from the indexes like the single-member statistics.
+"""
+from slr_hotspot.catalog import lookup
+from slr_hotspot.histogram import get_indexes
+from slr_hotspot.sources import SLR_BIN_WIDTH, SLR_ENSEMBLE, SLR_ENSEMBLES, SLR_RANGE, slr_url
+
+
+def ensemble_hotspot_stats(scenario, year, zone, geometries, crs, value_range, ensembles=SLR_ENSEMBLES):
+    """Hotspot statistics of a delta per ensemble member: {ensemble: raster_stats-like dict}."""
+    urls = {ensemble: slr_url(scenario, year, ensemble) for ensemble in ensembles}
+    stats = {ensemble: lookup(url, zone, value_range) for ensemble, url in urls.items()}
+    missing = [ensemble for ensemble in ensembles if stats[ensemble] is None]
+    if missing:
+        indexes = get_indexes([urls[ensemble] for ensemble in missing], zone, geometries, crs, SLR_RANGE, SLR_BIN_WIDTH)
+        stats.update({ensemble: index.query(tuple(value_range)) for ensemble, index in zip(missing, indexes)})
+    return stats
+
+
+def uncertainty_band(stats, statistic="mean", low=SLR_ENSEMBLES[0], median=SLR_ENSEMBLE, high=SLR_ENSEMBLES[-1]):
+    """(low, median, high) of one statistic over the ensemble members."""
+    return stats[low][statistic], stats[median][statistic], stats[high][statistic]
@@ -0,0 +1,143 @@
+"""
+Download of the hotspot of a delta: the pixels inside the delta whose value
+lies in the selected range.
+
+The AOI window is streamed block by block from the source raster straight to
+the output, so exporting a large delta only ever holds one block in memory:
+
+- "cog": blocks are masked and written to a tiled GeoTIFF, which GDAL then
+  copies into a Cloud Optimized GeoTIFF (CreateCopy reads it block-wise too),
+- "netcdf": the same tiled GeoTIFF copied by the GDAL netCDF driver,
+- "geoparquet": one point per hotspot pixel (centre, value), appended to a
+  GeoParquet file one row group at a time.
+
+Masked-out pixels are nodata in the rasters and absent from the point table.
+Exports are kept in the cache folder under a key of the inputs, so repeated
+downloads of the same applied state are served from disk.
+"""
+import hashlib
+import json
+import os
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+import rasterio
+import rasterio.shutil
+import shapely
+from pyproj import CRS
+
+from slr_hotspot.cache import atomic_path, path_lock
+from slr_hotspot.raster import GDAL_ENV, aoi_window, masked_blocks, window_slice
+from slr_hotspot.sources import CACHE_DIR, SANITY_THRESHOLD
+
+EXPORT_DIR = os.path.join(CACHE_DIR, "exports")
+FORMATS = {"cog": ".tif", "netcdf": ".nc", "geoparquet": ".parquet"}
+MIME_TYPES = {"cog": "image/tiff", "netcdf": "application/x-netcdf", "geoparquet": "application/vnd.apache.parquet"}
+# Points are buffered up to this many rows per Parquet row group
+ROW_GROUP_SIZE = 256 * 1024
+
+
+def export_key(url, zone, value_range, fmt, threshold=SANITY_THRESHOLD):
+    """Cache key of an export (raster, delta, range and format)."""
+    return hashlib.sha1(repr((url, zone, tuple(value_range), threshold, fmt)).encode()).hexdigest()[:16]
+
+
+def export_path(url, zone, value_range, fmt, threshold=SANITY_THRESHOLD):
+    return os.path.join(EXPORT_DIR, f"hotspot_{export_key(url, zone, value_range, fmt, threshold)}{FORMATS[fmt]}")
+
+
+def _write_raster(src, window, mask, value_range, threshold, band, path, driver):
+    nodata = src.nodata
+    if nodata is None:
+        nodata = np.nan if np.issubdtype(np.dtype(src.dtypes[band - 1]), np.floating) else 0
+    profile = {
+        "driver": "GTiff",
+        "width": window.width,
+        "height": window.height,
+        "count": 1,
+        "dtype": src.dtypes[band - 1],
+        "crs": src.crs,
+        "transform": src.window_transform(window),
+        "nodata": nodata,
+        "tiled": True,
+        "blockxsize": 512,
+        "blockysize": 512,
+        "compress": "deflate",
+    }
+    # `path` is a unique temporary name, so the staging file next to it is too
+    staging = path + ".staging.tif"
+    try:
+        with rasterio.open(staging, "w", **profile) as dst:
+            for block_window, block, keep in masked_blocks(src, window, mask, value_range, threshold, band):
+                block[~keep] = nodata
+                rows, cols = window_slice(block_window, window)
+                dst.write(block, 1, window=((rows.start, rows.stop), (cols.start, cols.stop)))
+        options = {"COMPRESS": "DEFLATE"} if driver == "COG" else {"FORMAT": "NC4", "COMPRESS": "DEFLATE"}
+        rasterio.shutil.copy(staging, path, driver=driver, **options)
+    finally:
+        if os.path.exists(staging):
+            rasterio.shutil.delete(staging)
+
+
+def _geo_metadata(crs):
+    return {
+        "version": "1.0.0",
+        "primary_column": "geometry",
+        "columns": {
+            "geometry": {
+                "encoding": "WKB",
+                "geometry_types": ["Point"],
+                "crs": CRS.from_wkt(crs.to_wkt()).to_json_dict(),
+            }
+        },
+    }
+
+
+def _write_points(src, window, mask, value_range, threshold, band, path):
+    schema = pa.schema(
+        [("x", pa.float64()), ("y", pa.float64()), ("value", pa.from_numpy_dtype(np.dtype(src.dtypes[band - 1]))), ("geometry", pa.binary())],
+        metadata={"geo": json.dumps(_geo_metadata(src.crs))},
+    )
+    buffered, rows = [], 0
+    with pq.ParquetWriter(path, schema, compression="zstd") as writer:
+        for block_window, block, keep in masked_blocks(src, window, mask, value_range, threshold, band):
+            row, col = np.nonzero(keep)
+            if row.size == 0:
+                continue
+            x, y = src.xy(row + int(block_window.row_off), col + int(block_window.col_off))
+            x, y = np.asarray(x), np.asarray(y)
+            buffered.append(pa.table({"x": x, "y": y, "value": block[keep], "geometry": shapely.to_wkb(shapely.points(x, y))}, schema=schema))
+            rows += row.size
+            if rows >= ROW_GROUP_SIZE:
+                writer.write_table(pa.concat_tables(buffered), row_group_size=rows)
+                buffered, rows = [], 0
+        if buffered:
+            writer.write_table(pa.concat_tables(buffered), row_group_size=rows)
+
+
+def export_hotspot(url, zone, geometries, crs, value_range, fmt="cog", threshold=SANITY_THRESHOLD, band=1):
+    """
+    Write the hotspot of `geometries` (delta `zone`, in `crs`) within
+    `value_range` in format `fmt` (see FORMATS) and return the file path.
+
+    Files are written once per (url, zone, range, format); later calls return
+    the cached file. Concurrent downloads of the same export wait for the first.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format {fmt!r}, expected one of {sorted(FORMATS)}")
+    path = export_path(url, zone, value_range, fmt, threshold)
+    if os.path.exists(path):
+        return path
+    with path_lock(path):
+        if os.path.exists(path):
+            return path
+        with rasterio.Env(**GDAL_ENV), rasterio.open(url) as src, atomic_path(path, FORMATS[fmt]) as tmp_path:
+            window, mask = aoi_window(src, geometries, crs)
+            if window is None:
+                raise ValueError(f"{zone} does not overlap {url}")
+            if fmt == "geoparquet":
+                _write_points(src, window, mask, value_range, threshold, band, tmp_path)
+            else:
+                _write_raster(src, window, mask, value_range, threshold, band, tmp_path, "COG" if fmt == "cog" else "netCDF")
+    return path
@@ -0,0 +1,236 @@
+"""
+Histogram index answering hotspot range queries without touching the rasters.
+
+For every (raster, delta) pair the pixels inside the delta are binned once
+into fine, fixed-width bins over the slider range, keeping per bin the count,
+sum, sum of squares, minimum and maximum. The index is persisted as .npz under
+the cache folder, after which any (vmin, vmax) slider query is answered in
+O(bins) from memory.
+
+Error bound: bins lying completely inside [vmin, vmax] contribute exactly.
+Only the (at most two) bins containing vmin or vmax can be partially inside
+the range; they are included when their recorded value span overlaps it. With
+bin width w this means the count may include/exclude pixels whose value is
+within w of a range bound, and mean, min and max are off by less than w. For
+integer slider values the bin edges coincide with the bounds, so only pixels
+in [vmax, vmax + w) can be misattributed.
+"""
+import hashlib
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+
+import numpy as np
+import rasterio
+
+from slr_hotspot.cache import atomic_path, path_lock
+from slr_hotspot.kernels import masked_strips
+from slr_hotspot.raster import GDAL_ENV, MAX_WORKERS, _reduce_chunk, _split, aoi_window, block_windows, window_slice
+from slr_hotspot.sources import CACHE_DIR, SANITY_THRESHOLD
+
+INDEX_DIR = os.path.join(CACHE_DIR, "histograms")
+
+_INDEXES = {}
+_LOCK = threading.Lock()
+
+
+class HistogramIndex:
+    """Per-bin count/sum/sum of squares/min/max of the pixels of one AOI."""
+
+    def __init__(self, lower, bin_width, counts, sums, squares, mins, maxs):
+        self.lower = float(lower)
+        self.bin_width = float(bin_width)
+        self.counts = counts
+        self.sums = sums
+        self.squares = squares
+        self.mins = mins
+        self.maxs = maxs
+
+    @classmethod
+    def empty(cls, index_range, bin_width):
+        bins = int(round((index_range[1] - index_range[0]) / bin_width))
+        return cls(
+            index_range[0],
+            bin_width,
+            np.zeros(bins, dtype=np.int64),
+            np.zeros(bins),
+            np.zeros(bins),
+            np.full(bins, np.inf),
+            np.full(bins, -np.inf),
+        )
+
+    @property
+    def upper(self):
+        return self.lower + self.counts.size * self.bin_width
+
+    def add(self, values):
+        """Bin an array of values; values outside the index range are dropped."""
+        values = values[(values >= self.lower) & (values <= self.upper)].astype(np.float64, copy=False)
+        if values.size == 0:
+            return self
+        bins = self.counts.size
+        idx = np.clip(((values - self.lower) / self.bin_width).astype(np.int64), 0, bins - 1)
+        self.counts += np.bincount(idx, minlength=bins)
+        self.sums += np.bincount(idx, weights=values, minlength=bins)
+        self.squares += np.bincount(idx, weights=values * values, minlength=bins)
+        np.minimum.at(self.mins, idx, values)
+        np.maximum.at(self.maxs, idx, values)
+        return self
+
+    def merge(self, other):
+        self.counts += other.counts
+        self.sums += other.sums
+        self.squares += other.squares
+        np.minimum(self.mins, other.mins, out=self.mins)
+        np.maximum(self.maxs, other.maxs, out=self.maxs)
+        return self
+
+    def query(self, value_range):
+        """
+        Statistics of the indexed pixels with a value in `value_range` (inclusive).
+
+        Same return shape as raster_stats, plus "max_error", the bin width that
+        bounds the error of mean, min and max (see module docstring).
+        """
+        vmin, vmax = value_range
+        bins = self.counts.size
+        first = max(0, int(np.floor((vmin - self.lower) / self.bin_width)))
+        last = min(bins - 1, int(np.floor((vmax - self.lower) / self.bin_width)))
+        result = {"count": 0, "mean": np.nan, "min": np.nan, "max": np.nan, "std": np.nan, "max_error": self.bin_width}
+        if last < first:
+            return result
+        selected = slice(first, last + 1)
+        # Edge bins are kept only when their recorded values actually overlap the range
+        keep = (self.counts[selected] > 0) & (self.maxs[selected] >= vmin) & (self.mins[selected] <= vmax)
+        nonzero = np.flatnonzero(keep)
+        if nonzero.size == 0:
+            return result
+        count = self.counts[selected][keep].sum()
+        mean = self.sums[selected][keep].sum() / count
+        variance = max(self.squares[selected][keep].sum() / count - mean ** 2, 0.0)
+        result.update(
+            count=int(count),
+            mean=float(mean),
+            min=float(max(self.mins[first + nonzero[0]], vmin)),
+            max=float(min(self.maxs[first + nonzero[-1]], vmax)),
+            std=float(np.sqrt(variance)),
+        )
+        return result
+
+    def save(self, path):
+        with atomic_path(path, ".npz") as tmp_path:
+            np.savez(
+                tmp_path,
+                lower=self.lower,
+                bin_width=self.bin_width,
+                counts=self.counts,
+                sums=self.sums,
+                squares=self.squares,
+                mins=self.mins,
+                maxs=self.maxs,
+            )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(
+                data["lower"],
+                data["bin_width"],
+                data["counts"],
+                data["sums"],
+                data["squares"],
+                data["mins"],
+                data["maxs"],
+            )
+
+
+def index_reducer(window, mask, index_range, bin_width, threshold=SANITY_THRESHOLD):
+    """
+    Block reducer (see reduce_blocks) binning the hotspot pixels of a block
+    strip by strip (see kernels.masked_strips), without block-sized copies.
+    """
+    def func(block, block_window, nodata):
+        index = HistogramIndex.empty(index_range, bin_width)
+        for values in masked_strips(block, mask[window_slice(block_window, window)], nodata, index_range, threshold):
+            index.add(values)
+        return index
+    return func
+
+
+def build_indexes(urls, geometries, crs, index_range, bin_width, threshold=SANITY_THRESHOLD, band=1, max_workers=MAX_WORKERS):
+    """
+    HistogramIndexes of several rasters on the same grid (e.g. the ensemble
+    members of one scenario and year).
+
+    The AOI window, block list and mask are computed once from the first
+    raster, and the blocks of all rasters are read on one thread pool, so the
+    wall time is close to that of a single raster.
+    """
+    with rasterio.Env(**GDAL_ENV), rasterio.open(urls[0]) as src:
+        window, mask = aoi_window(src, geometries, crs)
+        if window is None:
+            return [HistogramIndex.empty(index_range, bin_width) for _ in urls]
+        windows = block_windows(src, band, window)
+
+    func = index_reducer(window, mask, index_range, bin_width, threshold)
+
+    chunks = _split(windows, max(1, max_workers // len(urls)))
+    with ThreadPoolExecutor(max_workers=len(chunks) * len(urls)) as pool:
+        futures = [[pool.submit(_reduce_chunk, url, chunk, band, func, HistogramIndex.merge) for chunk in chunks] for url in urls]
+        indexes = []
+        for url_futures in futures:
+            index = HistogramIndex.empty(index_range, bin_width)
+            for future in url_futures:
+                part = future.result()
+                if part is not None:
+                    index.merge(part)
+            indexes.append(index)
+    return indexes
+
+
+def index_path(url, zone, index_range, bin_width):
+    key = f"{url}|{zone}|{index_range[0]}|{index_range[1]}|{bin_width}"
+    return os.path.join(INDEX_DIR, hashlib.sha1(key.encode()).hexdigest() + ".npz")
+
+
+def get_index(url, zone, geometries, crs, index_range, bin_width):
+    """HistogramIndex of a (raster, delta) pair: from memory, from disk, or built once."""
+    return get_indexes([url], zone, geometries, crs, index_range, bin_width)[0]
+
+
+def _cached_indexes(paths):
+    """{path: HistogramIndex} of the paths held in memory or on disk."""
+    with _LOCK:
+        indexes = {path: _INDEXES[path] for path in paths if path in _INDEXES}
+    for path in paths:
+        if path not in indexes and os.path.exists(path):
+            indexes[path] = HistogramIndex.load(path)
+    return indexes
+
+
+def get_indexes(urls, zone, geometries, crs, index_range, bin_width):
+    """HistogramIndexes of rasters on the same grid for one delta; the missing ones are built together."""
+    paths = [index_path(url, zone, index_range, bin_width) for url in urls]
+    indexes = _cached_indexes(paths)
+    missing = sorted({path: url for url, path in zip(urls, paths) if path not in indexes}.items())
+    if missing:
+        # Jobs asking for the same index wait for the first build instead of repeating it
+        with ExitStack() as stack:
+            for path, _ in missing:
+                stack.enter_context(path_lock(path))
+            indexes.update(_cached_indexes([path for path, _ in missing]))
+            missing = [(path, url) for path, url in missing if path not in indexes]
+            if missing:
+                built = build_indexes([url for _, url in missing], geometries, crs, index_range, bin_width)
+                for (path, _), index in zip(missing, built):
+                    index.save(path)
+                    indexes[path] = index
+    with _LOCK:
+        _INDEXES.update(indexes)
+    return [indexes[path] for path in paths]
+
+
+def indexed_hotspot_stats(url, zone, geometries, crs, value_range, index_range, bin_width):
+    """Hotspot statistics of a delta for any slider range, answered from the histogram index."""
+    return get_index(url, zone, geometries, crs, index_range, bin_width).query(value_range)
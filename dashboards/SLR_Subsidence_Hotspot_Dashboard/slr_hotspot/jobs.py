@@ -0,0 +1,84 @@
+"""
+Background jobs of the dashboard, run on a shared thread pool.
+
+Each dashboard session keeps a JobGroup. Jobs are keyed by the snapshot of the
+state that started them, so re-rendering with the same state reuses the
+running jobs, and moving to a new snapshot cancels the jobs of the old one that
+have not started yet. Jobs that are already running cannot be interrupted; they
+finish (filling the statistics caches) but their results are no longer shown.
+
+Results that do not depend on the session state (e.g. the all-deltas comparison
+table or the statistics of a whole dataset) are shared jobs: one future per key for the whole process, kept across
+snapshots and sessions.
+
+Approximate jobs (overview reads, see raster.approximate_stats) run on their own
+pool, so their quick answers never wait behind full-resolution reads.
+"""
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+MAX_WORKERS = int(os.getenv("SLR_HOTSPOT_JOB_WORKERS", "4"))
+APPROX_WORKERS = int(os.getenv("SLR_HOTSPOT_APPROX_WORKERS", "2"))
+SHARED_JOBS_SIZE = 32
+
+_EXECUTOR = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="slr-hotspot-job")
+_APPROX_EXECUTOR = ThreadPoolExecutor(max_workers=APPROX_WORKERS, thread_name_prefix="slr-hotspot-approx")
+
+_SHARED = OrderedDict()
+_SHARED_LOCK = threading.Lock()
+
+
+def shared_job(key, func, *args, approx=False):
+    """
+    Future of func(*args), shared by all sessions asking for the same `key`.
+
+    The last SHARED_JOBS_SIZE futures are kept; failed or cancelled jobs are
+    started again on the next request. `approx` jobs go to the pool reserved
+    for approximate statistics.
+    """
+    with _SHARED_LOCK:
+        future = _SHARED.get(key)
+        if future is not None and future.done() and (future.cancelled() or future.exception() is not None):
+            future = None
+        if future is None:
+            executor = _APPROX_EXECUTOR if approx else _EXECUTOR
+            future = _SHARED[key] = executor.submit(func, *args)
+        _SHARED.move_to_end(key)
+        while len(_SHARED) > SHARED_JOBS_SIZE:
+            _SHARED.popitem(last=False)
+        return future
+
+
+class JobGroup:
+    """Futures of the jobs of one session, tied to the state snapshot that started them."""
+
+    def __init__(self):
+        self._snapshot = None
+        self._futures = {}
+        self._lock = threading.RLock()
+
+    def submit(self, snapshot, name, func, *args, approx=False):
+        """
+        Future of func(*args) for a state snapshot.
+
+        The same (snapshot, name) returns the same future. A new snapshot
+        cancels the pending jobs of the previous one. `approx` jobs go to the
+        pool reserved for approximate statistics.
+        """
+        with self._lock:
+            if snapshot != self._snapshot:
+                self.cancel()
+                self._snapshot = snapshot
+            if name not in self._futures:
+                executor = _APPROX_EXECUTOR if approx else _EXECUTOR
+                self._futures[name] = executor.submit(func, *args)
+            return self._futures[name]
+
+    def cancel(self):
+        """Cancel the jobs that did not start yet and forget all jobs."""
+        with self._lock:
+            for future in self._futures.values():
+                future.cancel()
+            self._futures = {}
@@ -0,0 +1,131 @@
+"""
+Fused mask-and-reduce kernel for the hotspot statistics.
+
+Selecting the hotspot pixels of a block and reducing them used to take
+several block-sized temporaries: the copied AOI mask, one boolean array per
+comparison, the compacted values, their float64 copy and the squared
+deviations. The kernel walks a block in row strips of about STRIP_PIXELS
+instead. Each strip is masked (AOI, nodata, value range, threshold) into
+small reusable buffers, in the native dtype. Its selected values are then
+folded into count, sum, sum of squares, min and max. Nothing larger than a
+strip is allocated, however big the block, and the strip buffers stay in
+the CPU cache.
+
+Compare both paths on a synthetic block from the dashboard folder with:
+
+    python -m slr_hotspot.kernels benchmark
+"""
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+
+# Pixels per strip: small enough for the buffers to stay in cache
+STRIP_PIXELS = 64 * 1024
+
+
+def keep_mask(block, mask, nodata=None, value_range=None, threshold=np.inf, out=None, scratch=None):
+    """
+    Boolean array of the pixels of `block` selected by `mask` (same shape)
+    that are valid (not NaN, not `nodata`), within `value_range` when given and
+    not above `threshold`. Written to `out` when given; `scratch` is an
+    optional buffer of the same shape for the comparisons.
+    """
+    out = np.empty(block.shape, dtype=bool) if out is None else out
+    scratch = np.empty(block.shape, dtype=bool) if scratch is None else scratch
+    # Comparisons with NaN are False, so the threshold also drops NaN
+    np.less_equal(block, threshold, out=out)
+    out &= mask
+    if nodata is not None and not np.isnan(nodata):
+        np.not_equal(block, nodata, out=scratch)
+        out &= scratch
+    if value_range is not None:
+        np.greater_equal(block, value_range[0], out=scratch)
+        out &= scratch
+        np.less_equal(block, value_range[1], out=scratch)
+        out &= scratch
+    return out
+
+
+def masked_strips(block, mask, nodata=None, value_range=None, threshold=np.inf):
+    """
+    Yield the values of `block` selected as in keep_mask, one row strip of
+    about STRIP_PIXELS at a time, masked into two reused strip buffers.
+    """
+    height, width = block.shape
+    rows = max(1, min(height, STRIP_PIXELS // max(width, 1)))
+    keep = np.empty((rows, width), dtype=bool)
+    scratch = np.empty((rows, width), dtype=bool)
+    for row in range(0, height, rows):
+        strip = block[row:row + rows]
+        n = strip.shape[0]
+        yield strip[keep_mask(strip, mask[row:row + rows], nodata, value_range, threshold, keep[:n], scratch[:n])]
+
+
+def masked_moments(block, mask, nodata=None, value_range=None, threshold=np.inf):
+    """
+    (count, sum, sum of squares, min, max) of the pixels of `block` selected as
+    in keep_mask, in one strip-wise pass.
+    """
+    count, total, squares = 0, 0.0, 0.0
+    low, high = np.inf, -np.inf
+    for values in masked_strips(block, mask, nodata, value_range, threshold):
+        if values.size:
+            count += values.size
+            total += float(values.sum(dtype=np.float64))
+            squares += float(np.einsum("i,i->", values, values, dtype=np.float64))
+            low = min(low, float(values.min()))
+            high = max(high, float(values.max()))
+    return count, total, squares, low, high
+
+
+def _copying_moments(block, mask, nodata, value_range, threshold):
+    """Reference: the same statistics through full-size masks and copies."""
+    keep = mask.copy()
+    keep &= block != nodata
+    keep &= block >= value_range[0]
+    keep &= block <= value_range[1]
+    keep &= block <= threshold
+    values = block[keep].astype(np.float64)
+    mean = values.mean()
+    m2 = np.square(values - mean).sum()
+    return values.size, values.sum(), m2 + values.size * mean ** 2, values.min(), values.max()
+
+
+def _measure(func, repeat):
+    """Result, best time and peak traced allocation of `func()`."""
+    durations, peak = [], 0
+    for _ in range(repeat):
+        tracemalloc.start()
+        start = time.perf_counter()
+        result = func()
+        durations.append(time.perf_counter() - start)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return result, min(durations), peak
+
+
+def benchmark(size=2048, repeat=5):
+    """Print time and peak memory of the copying path and the fused kernel on one block."""
+    rng = np.random.default_rng(0)
+    block = rng.random((size, size), dtype=np.float32) * 400
+    block[rng.random((size, size)) < 0.1] = -9999
+    mask = rng.random((size, size)) < 0.7
+    args = (block, mask, -9999, (50, 350), 200)
+
+    print(f"{size} x {size} float32 block ({block.nbytes / 1e6:.1f} MB)")
+    results = {}
+    for label, func in [("copying", _copying_moments), ("fused", masked_moments)]:
+        results[label], duration, peak = _measure(lambda: func(*args), repeat)
+        print(f"{label:>8}: {duration * 1000:8.1f} ms, peak {peak / 1e6:8.2f} MB (best of {repeat})")
+    if not np.allclose(results["copying"], results["fused"]):
+        print(f"Error: results differ ({results['copying']} vs {results['fused']})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the fused hotspot statistics kernel.")
+    parser.add_argument("command", choices=["benchmark"])
+    parser.add_argument("--size", type=int, default=2048, help="block size in pixels")
+    args = parser.parse_args()
+    benchmark(args.size)
@@ -0,0 +1,154 @@
+import leafmap as leafmap
+from shapely.geometry import shape
+
+from slr_hotspot.colormap import hex_lut
+from slr_hotspot.polygons import simplify_to_zoom
+from slr_hotspot.tiler import tile_url_template
+
+DELTA_STYLE = {"fillColor": "yellow", "color": "yellow", "weight": 3, "fillOpacity": 0.1}
+HOTSPOT_STYLE = {"fillColor": "red", "color": "red", "weight": 1, "fillOpacity": 0.4}
+
+
+class HotspotMap(leafmap.Map):
+    """
+    leafmap Map that is kept across renders and reconciles its layers.
+
+    The dashboard describes the wanted COG layers on every render; only layers
+    whose URL or colormap changed are replaced (new tiles), opacity changes are
+    applied to the existing tile layer in place.
+
+    With `tiler_url` the COG layers are plain XYZ layers served by
+    slr_hotspot.tiler instead of leafmap's add_cog_layer.
+
+    Vector layers (hotspot areas) are kept at full resolution and shown
+    simplified to the current zoom; zooming re-simplifies them.
+    """
+
+    def __init__(self, tiler_url=None, **kwargs):
+        super().__init__(**kwargs)
+        self.tiler_url = tiler_url
+        self._cog_layers = {}  # layer name -> spec of the layer currently on the map
+        self._delta_name = None
+        self._vector_layers = {}  # layer name -> (key, GeoDataFrame, style, shown zoom)
+        self._vector_lods = {}  # layer name -> {zoom: simplified GeoDataFrame}
+        self.observe(self._on_zoom, names="zoom")
+
+    def _find(self, name):
+        for layer in self.layers:
+            if getattr(layer, "name", None) == name:
+                return layer
+        return None
+
+    def _remove(self, name):
+        """Remove a layer by name and return its position in the layer list (or None)."""
+        layer = self._find(name)
+        if layer is None:
+            return None
+        index = list(self.layers).index(layer)
+        try:
+            self.remove_layer(layer)
+        except Exception as e:
+            print(f"Error removing layer {name}: {e}")
+        return index
+
+    def sync_cog_layers(self, specs):
+        """
+        Bring the COG layers in line with `specs`.
+
+        `specs` maps layer names to dicts with url, cmap, vmin, vmax and opacity
+        (0-1). Layers not in `specs` are removed, changed tiles (url, cmap or
+        range) are re-added at the same position, and opacity-only changes are
+        set on the existing layer without fetching new tiles.
+        """
+        for name in [name for name in self._cog_layers if name not in specs]:
+            self._remove(name)
+            del self._cog_layers[name]
+
+        for name, spec in specs.items():
+            current = self._cog_layers.get(name)
+            tiles = (spec["url"], spec["cmap"], spec["vmin"], spec["vmax"])
+            if current is not None and tiles == (current["url"], current["cmap"], current["vmin"], current["vmax"]):
+                layer = self._find(name)
+                if layer is not None and current["opacity"] != spec["opacity"]:
+                    layer.opacity = spec["opacity"]
+            else:
+                index = self._remove(name) if current is not None else None
+                if index is None and self._find("Deltas") is not None:
+                    # Keep the delta outline on top of the rasters
+                    index = list(self.layers).index(self._find("Deltas"))
+                self._add_cog(name, spec, index)
+            self._cog_layers[name] = dict(spec)
+
+    def _add_cog(self, name, spec, index):
+        if self.tiler_url:
+            self.add_tile_layer(
+                tile_url_template(self.tiler_url, spec["url"], spec["cmap"], spec["vmin"], spec["vmax"]),
+                name=name,
+                attribution="",
+                opacity=spec["opacity"],
+                layer_index=index,
+            )
+        else:
+            self.add_cog_layer(
+                spec["url"],
+                colormap=hex_lut(spec["cmap"], spec["vmin"], spec["vmax"]),
+                name=name,
+                opacity=spec["opacity"],
+                zoom_to_layer=False,
+                layer_index=index,
+            )
+
+    def sync_vector_layer(self, name, gdf, key, style=HOTSPOT_STYLE):
+        """
+        Show `gdf` (EPSG:4326, full resolution) as one GeoJSON layer `name`,
+        simplified to the current zoom and replaced only when `key` changed.
+        None (or an empty GeoDataFrame) removes the layer.
+        """
+        current = self._vector_layers.get(name)
+        if current is not None and current[0] == key:
+            return
+        self._remove(name)
+        self._vector_layers.pop(name, None)
+        self._vector_lods.pop(name, None)
+        if gdf is not None and not gdf.empty:
+            self._vector_layers[name] = (key, gdf, style, None)
+            self._show_vector(name)
+
+    def _show_vector(self, name):
+        key, gdf, style, _ = self._vector_layers[name]
+        zoom = int(round(self.zoom))
+        lods = self._vector_lods.setdefault(name, {})
+        if zoom not in lods:
+            lods[zoom] = simplify_to_zoom(gdf, zoom)
+        self._remove(name)
+        self.add_gdf(lods[zoom], layer_name=name, style=style, zoom_to_layer=False)
+        self._vector_layers[name] = (key, gdf, style, zoom)
+
+    def _on_zoom(self, change):
+        for name, (_, _, _, shown_zoom) in list(self._vector_layers.items()):
+            if int(round(change["new"])) != shown_zoom:
+                self._show_vector(name)
+
+    def on_aoi_change(self, callback):
+        """
+        Call `callback(geometry)` when the user draws or edits a polygon on the
+        map (shapely geometry, EPSG:4326), and `callback(None)` when it is deleted.
+        """
+        def handle_draw(target, action, geo_json):
+            if action == "deleted":
+                callback(None)
+            elif geo_json.get("geometry", {}).get("type") in ("Polygon", "MultiPolygon"):
+                callback(shape(geo_json["geometry"]))
+
+        self.draw_control.on_draw(handle_draw)
+
+    def sync_delta(self, gdf, name, center, zoom=7):
+        """Show the outline of the selected delta and center on it, only when the delta changed."""
+        if name == self._delta_name:
+            return
+        if self._delta_name is not None:
+            self._remove("Deltas")
+        self.add_gdf(gdf, layer_name="Deltas", style=DELTA_STYLE)
+        self.center = center
+        self.zoom = zoom
+        self._delta_name = name
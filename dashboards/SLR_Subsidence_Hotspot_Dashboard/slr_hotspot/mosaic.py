@@ -0,0 +1,125 @@
+"""
+Virtual mosaic (GDAL VRT) of the subsidence COG tiles covering a delta.
+
+A delta can cross the border of the 3 degree tiles. The VRT stitches all
+tiles it touches into one dataset without downloading them: only the tile
+headers are read to write the VRT, and pixel reads through the VRT fetch the
+blocks of the underlying COGs with HTTP range requests. The block-streamed
+readers in slr_hotspot.raster read windows on several threads, so blocks of
+different tiles are fetched in parallel.
+
+VRT files are written to the cache folder once per set of tiles and can be
+opened by anything using GDAL (rasterio, the local tiler, QGIS).
+"""
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+from xml.sax.saxutils import escape
+
+import rasterio
+
+from slr_hotspot.cache import atomic_path, path_lock
+from slr_hotspot.raster import GDAL_ENV, MAX_WORKERS
+from slr_hotspot.sources import CACHE_DIR
+
+MOSAIC_DIR = os.path.join(CACHE_DIR, "mosaics")
+
+
+def gdal_path(url):
+    """Path GDAL can open for a URL or local file."""
+    return f"/vsicurl/{url}" if url.startswith("http") else os.path.abspath(url)
+
+
+def _tile_info(url):
+    with rasterio.Env(**GDAL_ENV), rasterio.open(url) as src:
+        return {
+            "path": gdal_path(url),
+            "crs": src.crs,
+            "transform": src.transform,
+            "width": src.width,
+            "height": src.height,
+            "dtype": src.dtypes[0],
+            "nodata": src.nodata,
+            "block_shape": src.block_shapes[0],
+        }
+
+
+def _number(value):
+    """Pixel offset for the VRT, as an integer when it falls on the grid."""
+    return str(int(round(value))) if abs(value - round(value)) < 1e-6 else repr(value)
+
+
+def vrt_xml(tiles):
+    """
+    VRT document mosaicking tiles that share CRS, resolution and data type.
+
+    `tiles` are dicts as returned by _tile_info. Where tiles overlap, nodata
+    pixels of one tile do not hide valid pixels of the other.
+    """
+    first = tiles[0]
+    res_x, res_y = first["transform"].a, -first["transform"].e
+    for tile in tiles[1:]:
+        if tile["crs"] != first["crs"] or tile["dtype"] != first["dtype"] or (tile["transform"].a, -tile["transform"].e) != (res_x, res_y):
+            raise ValueError(f"Cannot mosaic {tile['path']}: CRS, resolution or data type differs from {first['path']}")
+
+    left = min(t["transform"].c for t in tiles)
+    top = max(t["transform"].f for t in tiles)
+    right = max(t["transform"].c + t["width"] * res_x for t in tiles)
+    bottom = min(t["transform"].f - t["height"] * res_y for t in tiles)
+    width = int(round((right - left) / res_x))
+    height = int(round((top - bottom) / res_y))
+    block_height, block_width = first["block_shape"]
+    data_type = rasterio.dtypes._gdal_typename(first["dtype"])
+    nodata = first["nodata"]
+
+    lines = [
+        f'<VRTDataset rasterXSize="{width}" rasterYSize="{height}">',
+        f"  <SRS>{escape(first['crs'].to_wkt())}</SRS>",
+        f"  <GeoTransform>{left!r}, {res_x!r}, 0, {top!r}, 0, {-res_y!r}</GeoTransform>",
+        f'  <VRTRasterBand dataType="{data_type}" band="1" blockXSize="{block_width}" blockYSize="{block_height}">',
+    ]
+    if nodata is not None:
+        lines.append(f"    <NoDataValue>{nodata!r}</NoDataValue>")
+    for tile in tiles:
+        x_off = (tile["transform"].c - left) / res_x
+        y_off = (top - tile["transform"].f) / res_y
+        tile_block_height, tile_block_width = tile["block_shape"]
+        lines += [
+            "    <ComplexSource>",
+            f'      <SourceFilename relativeToVRT="0">{escape(tile["path"])}</SourceFilename>',
+            "      <SourceBand>1</SourceBand>",
+            # Lets GDAL open the tile only when a read touches it
+            f'      <SourceProperties RasterXSize="{tile["width"]}" RasterYSize="{tile["height"]}" DataType="{data_type}" BlockXSize="{tile_block_width}" BlockYSize="{tile_block_height}"/>',
+            f'      <SrcRect xOff="0" yOff="0" xSize="{tile["width"]}" ySize="{tile["height"]}"/>',
+            f'      <DstRect xOff="{_number(x_off)}" yOff="{_number(y_off)}" xSize="{tile["width"]}" ySize="{tile["height"]}"/>',
+        ]
+        if tile["nodata"] is not None:
+            lines.append(f"      <NODATA>{tile['nodata']!r}</NODATA>")
+        lines.append("    </ComplexSource>")
+    lines += ["  </VRTRasterBand>", "</VRTDataset>", ""]
+    return "\n".join(lines)
+
+
+def mosaic_url(urls):
+    """
+    Single dataset covering all `urls`.
+
+    One URL is returned as is; several are combined in a VRT in the cache
+    folder (written on first use) and its path is returned. None for no URLs.
+    """
+    urls = sorted(dict.fromkeys(urls))
+    if not urls:
+        return None
+    if len(urls) == 1:
+        return urls[0]
+    key = hashlib.sha1("\n".join(urls).encode()).hexdigest()[:16]
+    path = os.path.join(MOSAIC_DIR, f"mosaic_{key}.vrt")
+    if not os.path.exists(path):
+        # Map renders and background jobs ask for the same mosaic concurrently
+        with path_lock(path):
+            if not os.path.exists(path):
+                with ThreadPoolExecutor(max_workers=min(len(urls), MAX_WORKERS)) as pool:
+                    tiles = list(pool.map(_tile_info, urls))
+                with atomic_path(path) as tmp_path, open(tmp_path, "w") as f:
+                    f.write(vrt_xml(tiles))
+    return path
@@ -0,0 +1,86 @@
+"""
+Hotspot areas as vector polygons.
+
+The in-range mask of a delta is built block by block over the AOI window only
+(one byte per pixel) and polygonized with rasterio.features.shapes into
+connected hotspot areas. Areas are measured in km² in an equal-area
+projection (EPSG:6933). Polygons are cached per (url, delta, range). The
+geometry sent to the map is simplified to the display zoom (see
+simplify_to_zoom and HotspotMap.sync_vector_layer), so one lightweight
+GeoJSON layer replaces the per-pixel transparency.
+"""
+import threading
+from collections import OrderedDict
+
+import geopandas as gpd
+import numpy as np
+import rasterio
+from rasterio.features import shapes
+from shapely.geometry import shape
+
+from slr_hotspot.raster import GDAL_ENV, aoi_window, masked_blocks, window_slice
+from slr_hotspot.sources import SANITY_THRESHOLD
+
+AREA_CRS = "EPSG:6933"
+# Number of (url, delta, range) polygon sets kept in memory
+POLYGON_CACHE_SIZE = 32
+
+_POLYGONS = OrderedDict()
+_LOCK = threading.Lock()
+
+
+def hotspot_mask(src, window, mask, value_range, threshold=SANITY_THRESHOLD, band=1):
+    """uint8 array over `window`: 1 for hotspot pixels, 0 elsewhere."""
+    hotspot = np.zeros((int(window.height), int(window.width)), dtype=np.uint8)
+    for block_window, _, keep in masked_blocks(src, window, mask, value_range, threshold, band):
+        hotspot[window_slice(block_window, window)] = keep
+    return hotspot
+
+
+def polygonize_hotspot(url, geometries, crs, value_range, threshold=SANITY_THRESHOLD, band=1):
+    """
+    Connected hotspot areas of `geometries` (in `crs`) within `value_range`.
+
+    Returns a GeoDataFrame in EPSG:4326 with one polygon per area and its
+    "area_km2", largest first.
+    """
+    with rasterio.Env(**GDAL_ENV), rasterio.open(url) as src:
+        window, mask = aoi_window(src, geometries, crs)
+        if window is None:
+            return gpd.GeoDataFrame({"area_km2": []}, geometry=[], crs="EPSG:4326")
+        hotspot = hotspot_mask(src, window, mask, value_range, threshold, band)
+        polygons = [shape(geometry) for geometry, _ in shapes(hotspot, mask=hotspot.astype(bool), transform=src.window_transform(window))]
+        gdf = gpd.GeoDataFrame(geometry=polygons, crs=src.crs)
+    gdf["area_km2"] = gdf.to_crs(AREA_CRS).area / 1e6
+    return gdf.to_crs(4326).sort_values("area_km2", ascending=False, ignore_index=True)
+
+
+def zoom_tolerance(zoom):
+    """Size in degrees of one screen pixel (256 px web tiles) at `zoom`."""
+    return 360 / (256 * 2 ** zoom)
+
+
+def simplify_to_zoom(gdf, zoom):
+    """Copy of `gdf` (EPSG:4326) with its geometries simplified to one screen pixel at `zoom`."""
+    simplified = gdf.copy()
+    simplified["geometry"] = gdf.geometry.simplify(zoom_tolerance(zoom), preserve_topology=True)
+    return simplified
+
+
+def hotspot_polygons(url, zone, geometries, crs, value_range, threshold=SANITY_THRESHOLD):
+    """
+    Hotspot areas of delta `zone` (see polygonize_hotspot), cached per
+    (url, zone, value_range).
+    """
+    key = (url, zone, tuple(value_range), threshold)
+    with _LOCK:
+        gdf = _POLYGONS.get(key)
+        if gdf is not None:
+            _POLYGONS.move_to_end(key)
+    if gdf is None:
+        gdf = polygonize_hotspot(url, geometries, crs, value_range, threshold)
+        with _LOCK:
+            _POLYGONS[key] = gdf
+            while len(_POLYGONS) > POLYGON_CACHE_SIZE:
+                _POLYGONS.popitem(last=False)
+    return gdf
@@ -0,0 +1,444 @@
+"""
+Block-streamed statistics for the SLR and subsidence COGs.
+
+Rasters are read along their internal tiling (COG blocks), one block at a time
+per worker, so memory stays bounded by a few blocks regardless of the raster
+size. Blocks are spread over a thread pool; GDAL releases the GIL while
+fetching and decoding, so all cores are used.
+"""
+import hashlib
+import math
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import rasterio
+from affine import Affine
+from rasterio.enums import Resampling
+from rasterio.features import bounds as geometry_bounds
+from rasterio.features import geometry_mask
+from rasterio.warp import transform_geom
+from rasterio.windows import Window, from_bounds
+
+from slr_hotspot.kernels import keep_mask, masked_moments
+from slr_hotspot.sources import SANITY_THRESHOLD
+
+# GDAL settings for remote COGs: no sidecar-file probing, merged HTTP range requests
+GDAL_ENV = {
+    "GDAL_DISABLE_READDIR_ON_OPEN": "EMPTY_DIR",
+    "CPL_VSIL_CURL_ALLOWED_EXTENSIONS": ".tif,.tiff,.vrt",
+    "GDAL_HTTP_MULTIRANGE": "YES",
+    "GDAL_HTTP_MERGE_CONSECUTIVE_RANGES": "YES",
+    "VSI_CACHE": "TRUE",
+}
+
+MAX_WORKERS = os.cpu_count() or 4
+# Striped (non-tiled) rasters are grouped into windows of roughly this many pixels
+TARGET_BLOCK_PIXELS = 512 * 512
+HISTOGRAM_BINS = 1000
+# Number of (geometries, grid) windows and masks kept by aoi_window
+AOI_CACHE_SIZE = 64
+# Approximate statistics read about this many pixels from the COG overviews
+OVERVIEW_TARGET_PIXELS = 1_000_000
+# Exact (full resolution) statistics are skipped for reads above this many
+# million pixels; 0 (default) always runs the exact pass
+EXACT_MAX_MPIXELS = float(os.getenv("SLR_HOTSPOT_EXACT_MAX_MPIXELS", "0"))
+
+_AOI_CACHE = OrderedDict()
+_AOI_LOCK = threading.Lock()
+
+
+class RunningStats:
+    """
+    Mergeable count/mean/min/max/variance accumulator.
+
+    Partial results of different blocks are combined with Chan's parallel
+    update, so the result does not depend on the order blocks are read in.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def update(self, values):
+        """Fold a 1-D array of valid values into the accumulator."""
+        if values.size == 0:
+            return
+        values = values.astype(np.float64, copy=False)
+        block = RunningStats()
+        block.count = values.size
+        block.mean = values.mean()
+        block.m2 = np.square(values - block.mean).sum()
+        block.min = values.min()
+        block.max = values.max()
+        self.merge(block)
+
+    def merge(self, other):
+        """Combine another accumulator into this one."""
+        if other.count == 0:
+            return
+        if self.count == 0:
+            self.count, self.mean, self.m2 = other.count, other.mean, other.m2
+            self.min, self.max = other.min, other.max
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta ** 2 * self.count * other.count / count
+        self.count = count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    @classmethod
+    def from_moments(cls, count, total, squares, low, high):
+        """Accumulator of values known by their count, sum, sum of squares, min and max."""
+        stats = cls()
+        if count:
+            stats.count = count
+            stats.mean = total / count
+            stats.m2 = max(squares - total * stats.mean, 0.0)
+            stats.min, stats.max = low, high
+        return stats
+
+    def result(self):
+        """Return the statistics as a plain dict (NaN when no valid pixels were seen)."""
+        if self.count == 0:
+            return {"count": 0, "mean": np.nan, "min": np.nan, "max": np.nan, "std": np.nan}
+        return {
+            "count": int(self.count),
+            "mean": float(self.mean),
+            "min": float(self.min),
+            "max": float(self.max),
+            "std": float(np.sqrt(self.m2 / self.count)),
+        }
+
+
+def valid_values(block, nodata):
+    """Flatten a block to the values that are neither NaN nor the nodata value."""
+    values = block.ravel()
+    valid = np.ones(values.shape, dtype=bool)
+    if np.issubdtype(values.dtype, np.floating):
+        valid &= ~np.isnan(values)
+    if nodata is not None and not np.isnan(nodata):
+        valid &= values != nodata
+    return values[valid]
+
+
+def block_windows(src, band=1, window=None):
+    """
+    List the read windows of a dataset, following its internal block layout.
+
+    Striped rasters (one block per row strip) are grouped into windows of about
+    TARGET_BLOCK_PIXELS. When `window` is given only blocks intersecting it are
+    returned, cropped to it.
+    """
+    block_height, block_width = src.block_shapes[band - 1]
+    if block_width >= src.width:
+        rows = max(1, TARGET_BLOCK_PIXELS // max(src.width, 1))
+        block_height = max(block_height, (rows // block_height) * block_height)
+    if window is None:
+        window = Window(0, 0, src.width, src.height)
+    col_start, row_start = int(window.col_off), int(window.row_off)
+    col_stop, row_stop = col_start + int(window.width), row_start + int(window.height)
+
+    windows = []
+    first_row = (row_start // block_height) * block_height
+    first_col = (col_start // block_width) * block_width
+    for row in range(first_row, row_stop, block_height):
+        for col in range(first_col, col_stop, block_width):
+            r0, c0 = max(row, row_start), max(col, col_start)
+            r1 = min(row + block_height, row_stop, src.height)
+            c1 = min(col + block_width, col_stop, src.width)
+            if r1 > r0 and c1 > c0:
+                windows.append(Window(c0, r0, c1 - c0, r1 - r0))
+    return windows
+
+
+def _split(items, parts):
+    """Split a list into at most `parts` interleaved chunks."""
+    parts = max(1, min(parts, len(items)))
+    return [items[i::parts] for i in range(parts)]
+
+
+def _reduce_chunk(url, windows, band, func, merge):
+    """Worker: apply `func` to each window of a chunk and fold the partial results."""
+    result = None
+    with rasterio.Env(**GDAL_ENV), rasterio.open(url) as src:
+        for window in windows:
+            part = func(src.read(band, window=window), window, src.nodata)
+            result = part if result is None else merge(result, part)
+    return result
+
+
+def reduce_blocks(url, windows, func, merge, band=1, max_workers=MAX_WORKERS):
+    """
+    Generic block-streamed reduction over a thread pool.
+
+    `func(block, window, nodata)` turns one block into a partial result and
+    `merge(a, b)` combines two partial results. Returns None for no windows.
+    """
+    result = None
+    if not windows:
+        return result
+    chunks = _split(windows, max_workers)
+    with ThreadPoolExecutor(max_workers=len(chunks)) as pool:
+        for part in pool.map(lambda chunk: _reduce_chunk(url, chunk, band, func, merge), chunks):
+            if part is not None:
+                result = part if result is None else merge(result, part)
+    return result
+
+
+def _stats_reducer(hist_range, bins):
+    """Block reducer (see reduce_blocks) of raster_stats: RunningStats and histogram (or None) of the valid values."""
+    def func(block, block_window, nodata):
+        values = valid_values(block, nodata)
+        stats = RunningStats()
+        stats.update(values)
+        hist = np.histogram(values, bins=bins, range=hist_range)[0] if hist_range is not None else None
+        return stats, hist
+    return func
+
+
+def _merge_stats_hist(a, b):
+    stats, hist = a
+    stats.merge(b[0])
+    return stats, None if hist is None else hist + b[1]
+
+
+def histogram_percentiles(hist, hist_range, percentiles):
+    """Interpolate percentiles (0-100) from a histogram over `hist_range`."""
+    total = hist.sum()
+    if total == 0:
+        return {p: np.nan for p in percentiles}
+    edges = np.linspace(hist_range[0], hist_range[1], hist.size + 1)
+    cumulative = np.concatenate([[0], np.cumsum(hist)]) / total
+    return {p: float(np.interp(p / 100, cumulative, edges)) for p in percentiles}
+
+
+def raster_stats(url, band=1, percentiles=None, hist_range=None, bins=HISTOGRAM_BINS, max_workers=MAX_WORKERS):
+    """
+    Global statistics of a raster band in one block-streamed pass.
+
+    Parameters:
+    -----------
+    url : str
+        Local path or HTTP(S) URL of the (cloud optimized) GeoTIFF.
+    band : int
+        Band to reduce.
+    percentiles : list of float, optional
+        Percentiles (0-100) to estimate from a histogram with `bins` bins.
+    hist_range : tuple, optional
+        Value range of the percentile histogram. When omitted a second pass is
+        made over the observed [min, max], so pass it whenever the value range
+        is known beforehand to keep the reduction single pass.
+
+    Returns:
+    --------
+    dict
+        count, mean, min, max and std of the valid (non-nodata) pixels, plus
+        "percentiles" ({p: value}) when requested.
+    """
+    with rasterio.Env(**GDAL_ENV), rasterio.open(url) as src:
+        windows = block_windows(src, band)
+
+    reducer = _stats_reducer(hist_range if percentiles else None, bins)
+    stats, hist = reduce_blocks(url, windows, reducer, _merge_stats_hist, band, max_workers) or (RunningStats(), None)
+    result = stats.result()
+    if percentiles:
+        if hist is None:
+            hist_range = (result["min"], result["max"])
+            if stats.count == 0 or hist_range[0] == hist_range[1]:
+                result["percentiles"] = {p: result["min"] for p in percentiles}
+                return result
+            _, hist = reduce_blocks(url, windows, _stats_reducer(hist_range, bins), _merge_stats_hist, band, max_workers)
+        result["percentiles"] = histogram_percentiles(hist, hist_range, percentiles)
+    return result
+
+
+def shapes_window(src, shapes):
+    """
+    Pixel window covering the bounds of GeoJSON `shapes` (in the CRS of `src`),
+    snapped outwards to whole pixels and cropped to the raster; None when the
+    shapes do not overlap the raster.
+    """
+    boxes = np.array([geometry_bounds(shape) for shape in shapes])
+    window = from_bounds(*boxes[:, :2].min(axis=0), *boxes[:, 2:].max(axis=0), transform=src.transform)
+    col0 = max(0, math.floor(window.col_off))
+    row0 = max(0, math.floor(window.row_off))
+    col1 = min(src.width, math.ceil(window.col_off + window.width))
+    row1 = min(src.height, math.ceil(window.row_off + window.height))
+    if col1 <= col0 or row1 <= row0:
+        return None
+    return Window(col0, row0, col1 - col0, row1 - row0)
+
+
+def _aoi_key(src, geometries, crs):
+    h = hashlib.sha1()
+    h.update(str(crs).encode())
+    h.update(src.crs.to_wkt().encode())
+    h.update(repr((tuple(src.transform)[:6], src.width, src.height)).encode())
+    for geom in geometries:
+        h.update(geom.wkb)
+    return h.hexdigest()
+
+
+def aoi_window(src, geometries, crs):
+    """
+    Pixel window and polygon mask of shapely `geometries` (in `crs`) on the grid of `src`.
+
+    The window covers the bounds of the geometries, snapped outwards to whole
+    pixels and cropped to the raster. The mask is True inside the geometries
+    (pixel centres, as rio.clip does). Returns (None, None) when the geometries
+    do not overlap the raster.
+
+    Results are cached per (geometries, grid), so rasters on the same grid
+    (other SLR years or scenarios) reuse the rasterized mask. The mask is
+    read-only; copy it before modifying.
+    """
+    key = _aoi_key(src, geometries, crs)
+    with _AOI_LOCK:
+        if key in _AOI_CACHE:
+            _AOI_CACHE.move_to_end(key)
+            return _AOI_CACHE[key]
+    shapes = [transform_geom(crs, src.crs, geom.__geo_interface__) for geom in geometries]
+    window = shapes_window(src, shapes)
+    if window is None:
+        result = (None, None)
+    else:
+        mask = geometry_mask(
+            shapes,
+            out_shape=(window.height, window.width),
+            transform=src.window_transform(window),
+            invert=True,
+        )
+        mask.setflags(write=False)
+        result = (window, mask)
+    with _AOI_LOCK:
+        _AOI_CACHE[key] = result
+        while len(_AOI_CACHE) > AOI_CACHE_SIZE:
+            _AOI_CACHE.popitem(last=False)
+    return result
+
+
+def window_slice(window, outer):
+    """Array slices of `window` inside an array covering the `outer` window."""
+    row = int(window.row_off - outer.row_off)
+    col = int(window.col_off - outer.col_off)
+    return slice(row, row + int(window.height)), slice(col, col + int(window.width))
+
+
+def hotspot_reducer(window, mask, value_range, threshold=SANITY_THRESHOLD):
+    """
+    Block reducer (see reduce_blocks) of the pixels inside the AOI `mask` of
+    `window` that are valid, within `value_range` and not above `threshold`,
+    fused into one pass without block-sized copies (see slr_hotspot.kernels).
+    Returns a RunningStats per block.
+    """
+    def func(block, block_window, nodata):
+        moments = masked_moments(block, mask[window_slice(block_window, window)], nodata, value_range, threshold)
+        return RunningStats.from_moments(*moments)
+    return func
+
+
+def masked_blocks(src, window, mask, value_range, threshold=SANITY_THRESHOLD, band=1):
+    """
+    Yield (block window, block, keep) over the AOI `window` of an open dataset,
+    where `keep` marks the hotspot pixels as selected by hotspot_reducer.
+    """
+    for block_window in block_windows(src, band, window):
+        block = src.read(band, window=block_window)
+        keep = keep_mask(block, mask[window_slice(block_window, window)], src.nodata, value_range, threshold)
+        yield block_window, block, keep
+
+
+def _merge_stats(a, b):
+    a.merge(b)
+    return a
+
+
+def hotspot_stats(url, geometries, crs, value_range, threshold=SANITY_THRESHOLD, band=1, max_workers=MAX_WORKERS):
+    """
+    Statistics of the pixels inside `geometries` whose value lies in `value_range`.
+
+    Only the raster window covering the geometries is read, block by block, so
+    for a COG just the overlapping internal tiles are fetched (HTTP range
+    requests). Values above `threshold` are ignored. Same return shape as
+    raster_stats.
+    """
+    with rasterio.Env(**GDAL_ENV), rasterio.open(url) as src:
+        window, mask = aoi_window(src, geometries, crs)
+        if window is None:
+            return RunningStats().result()
+        windows = block_windows(src, band, window)
+
+    reducer = hotspot_reducer(window, mask, value_range, threshold)
+    stats = reduce_blocks(url, windows, reducer, _merge_stats, band, max_workers) or RunningStats()
+    return stats.result()
+
+
+def _read_extent(src, geometries=None, crs=None):
+    """Full-resolution window to read (whole raster, or bounds of the geometries) and the shapes in the raster CRS."""
+    if geometries is None:
+        return Window(0, 0, src.width, src.height), None
+    shapes = [transform_geom(crs, src.crs, geom.__geo_interface__) for geom in geometries]
+    return shapes_window(src, shapes), shapes
+
+
+def exact_allowed(url, geometries=None, crs=None):
+    """Policy: True when the full-resolution read is within EXACT_MAX_MPIXELS (always without a limit)."""
+    if not EXACT_MAX_MPIXELS:
+        return True
+    with rasterio.Env(**GDAL_ENV), rasterio.open(url) as src:
+        window, _ = _read_extent(src, geometries, crs)
+    return window is None or window.width * window.height <= EXACT_MAX_MPIXELS * 1e6
+
+
+def overview_factor(src, window, band=1, target_pixels=OVERVIEW_TARGET_PIXELS):
+    """
+    Decimation factor of the finest overview reading at most `target_pixels`
+    of `window` (the coarsest overview if none does), or None when the raster
+    has no overviews or the full-resolution window is already that small.
+    """
+    pixels = window.width * window.height
+    factors = src.overviews(band)
+    if pixels <= target_pixels or not factors:
+        return None
+    return next((f for f in factors if pixels / f ** 2 <= target_pixels), factors[-1])
+
+
+def approximate_stats(url, geometries=None, crs=None, value_range=None, threshold=SANITY_THRESHOLD, band=1, target_pixels=OVERVIEW_TARGET_PIXELS):
+    """
+    Quick statistics from a COG overview level.
+
+    Without geometries this approximates raster_stats, with geometries
+    hotspot_stats. The window is read once at the decimated shape (GDAL serves
+    it from the matching overview) and the AOI mask is rasterized at that
+    resolution. The result has "approximate": True and the "overview_factor"
+    used (count is in overview pixels); None is returned when no overview read
+    is possible or needed.
+    """
+    with rasterio.Env(**GDAL_ENV), rasterio.open(url) as src:
+        window, shapes = _read_extent(src, geometries, crs)
+        if window is None:
+            return {**RunningStats().result(), "approximate": True, "overview_factor": None}
+        factor = overview_factor(src, window, band, target_pixels)
+        if factor is None:
+            return None
+        out_shape = (max(1, round(window.height / factor)), max(1, round(window.width / factor)))
+        block = src.read(band, window=window, out_shape=out_shape, resampling=Resampling.nearest)
+        nodata = src.nodata
+        if shapes is not None:
+            transform = src.window_transform(window) * Affine.scale(window.width / out_shape[1], window.height / out_shape[0])
+            mask = geometry_mask(shapes, out_shape=out_shape, transform=transform, invert=True)
+
+    if shapes is None:
+        stats = RunningStats()
+        stats.update(valid_values(block, nodata))
+    else:
+        stats = RunningStats.from_moments(*masked_moments(block, mask, nodata, value_range, threshold))
+    return {**stats.result(), "approximate": True, "overview_factor": factor}
@@ -0,0 +1,157 @@
+"""
+Binary cache of the dashboard reference data.
+
+The GeoJSON/CSV files in data/ are converted once to uncompressed Arrow (Feather)
+files in the cache folder, already in EPSG:4326 and with the derived columns the
+dashboard needs (delta centroids, tile bounds). Loading then memory-maps the
+Arrow files instead of parsing GeoJSON, and each dataset is only loaded on first
+use. A cache file is rebuilt automatically when its source file is newer.
+
+Build the cache explicitly, or compare startup times, with:
+
+    python -m slr_hotspot.reference_data build
+    python -m slr_hotspot.reference_data benchmark
+"""
+import argparse
+import os
+import threading
+import time
+
+import geopandas as gpd
+import pandas as pd
+import shapely
+from pyarrow import feather
+
+from slr_hotspot.cache import atomic_path
+from slr_hotspot.sources import CACHE_DIR, DELTAS_FILE, RCP_FILE, STAC_METADATA_FILE
+
+REFERENCE_DIR = os.path.join(CACHE_DIR, "reference")
+
+_LOADED = {}
+_LOCK = threading.Lock()
+
+
+def _prepare_deltas():
+    gdf = gpd.read_file(DELTAS_FILE).to_crs(4326)
+    centroids = gdf.geometry.centroid
+    gdf["centroid_x"] = centroids.x
+    gdf["centroid_y"] = centroids.y
+    return gdf
+
+
+def _prepare_tiles():
+    gdf = gpd.read_file(STAC_METADATA_FILE).to_crs(4326)
+    bounds = gdf.geometry.bounds
+    return gdf.join(bounds)
+
+
+def _prepare_rcp():
+    return pd.read_csv(RCP_FILE)
+
+
+# name: (source file, function reading and preparing the source)
+DATASETS = {
+    "deltas": (DELTAS_FILE, _prepare_deltas),
+    "tiles": (STAC_METADATA_FILE, _prepare_tiles),
+    "rcp_scenarios": (RCP_FILE, _prepare_rcp),
+}
+
+
+def cache_path(name):
+    return os.path.join(REFERENCE_DIR, f"{name}.arrow")
+
+
+def _is_fresh(name):
+    source, _ = DATASETS[name]
+    path = cache_path(name)
+    return os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(source)
+
+
+def build(name):
+    """Convert one source file to its Arrow cache file and return the prepared data."""
+    _, prepare = DATASETS[name]
+    data = prepare()
+    # Uncompressed so the file can be memory-mapped without decoding
+    with atomic_path(cache_path(name)) as tmp_path:
+        data.to_feather(tmp_path, compression="uncompressed")
+    return data
+
+
+def build_all():
+    for name in DATASETS:
+        build(name)
+        print(f"Built {cache_path(name)}")
+
+
+def _read(name):
+    """Memory-map a cache file; geometries are decoded from WKB directly (all caches are EPSG:4326)."""
+    table = feather.read_table(cache_path(name), memory_map=True)
+    if "geometry" not in table.column_names:
+        return table.to_pandas()
+    df = table.drop_columns(["geometry"]).to_pandas()
+    geometry = shapely.from_wkb(table["geometry"].to_numpy(zero_copy_only=False))
+    return gpd.GeoDataFrame(df, geometry=geometry, crs=4326)
+
+
+def load(name):
+    """Reference dataset by name, memory-mapped from the cache (built or refreshed when needed)."""
+    with _LOCK:
+        if name not in _LOADED:
+            if _is_fresh(name):
+                _LOADED[name] = _read(name)
+            else:
+                try:
+                    _LOADED[name] = build(name)
+                except OSError as e:
+                    # Read-only installation: fall back to the source file
+                    print(f"Error writing reference cache for {name}: {e}")
+                    _LOADED[name] = DATASETS[name][1]()
+        return _LOADED[name]
+
+
+def load_deltas():
+    """Delta polygons (EPSG:4326) with `Location`, `centroid_x` and `centroid_y`."""
+    return load("deltas")
+
+
+def load_tiles():
+    """Subsidence tile footprints (EPSG:4326) with `id` and minx/miny/maxx/maxy."""
+    return load("tiles")
+
+
+def load_rcp_scenarios():
+    """RCP scenario short names and descriptions."""
+    return load("rcp_scenarios")
+
+
+def benchmark(repeat=5):
+    """Print the time to load all reference data from the sources and from the cache."""
+    build_all()
+    sources = [
+        lambda: gpd.read_file(DELTAS_FILE),
+        lambda: gpd.read_file(STAC_METADATA_FILE),
+        lambda: pd.read_csv(RCP_FILE),
+    ]
+    timings = {}
+    for label, load_all in [
+        ("source files", lambda: [read() for read in sources]),
+        ("arrow cache", lambda: [_read(name) for name in DATASETS]),
+    ]:
+        durations = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            load_all()
+            durations.append(time.perf_counter() - start)
+        timings[label] = min(durations)
+        print(f"{label:>12}: {timings[label] * 1000:8.1f} ms (best of {repeat})")
+    print(f"     speedup: {timings['source files'] / timings['arrow cache']:8.1f} x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or benchmark the reference data cache.")
+    parser.add_argument("command", choices=["build", "benchmark"])
+    args = parser.parse_args()
+    if args.command == "build":
+        build_all()
+    else:
+        benchmark()
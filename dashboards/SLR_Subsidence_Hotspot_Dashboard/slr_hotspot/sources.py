@@ -0,0 +1,65 @@
+"""
+Locations of the data used by the SLR / subsidence hotspot dashboard.
+"""
+import os
+
+# Local reference data shipped with the dashboard
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data")
+# Generated artifacts (statistics catalog, indexes, ...), not under version control
+CACHE_DIR = os.getenv("SLR_HOTSPOT_CACHE_DIR", os.path.join(DATA_DIR, "cache"))
+
+DELTAS_FILE = os.path.join(DATA_DIR, "Deltas.geojson")
+RCP_FILE = os.path.join(DATA_DIR, "rcp_scenarios.csv")
+STAC_METADATA_FILE = os.path.join(DATA_DIR, "stac_metadata.geojson")
+
+# Remote COGs
+SLR_URL = "https://storage.googleapis.com/coclico-data-public/coclico/ar6_slr/ssp={scenario}/slr_ens{ensemble}/{year}.tif"
+SUB_URL = "https://storage.googleapis.com/dgds-data-public/gca/SOTC/Haz-Land_Sub_2040_COGs/{tile_id}.tif"
+BUCKET_URL = "https://storage.googleapis.com/"
+# Optional local mirror of the buckets (same folder layout, e.g. <dir>/coclico-data-public/coclico/...)
+# to run fully offline
+LOCAL_COG_DIR = os.getenv("SLR_HOTSPOT_COG_DIR")
+# Tile rendering of the COG layers: unset uses leafmap's add_cog_layer (external tiler),
+# "local" starts slr_hotspot.tiler inside the dashboard process, any other value is the
+# URL of a running slr_hotspot.tiler
+TILER_URL = os.getenv("SLR_HOTSPOT_TILER_URL")
+# Address the "local" tiler listens on. Tiles are fetched by the browser, so the default
+# (loopback) only works when the browser runs on the dashboard machine; for remote users
+# listen on e.g. 0.0.0.0 and set the public URL to the address the browsers can reach
+# (host name or reverse proxy path)
+TILER_HOST = os.getenv("SLR_HOTSPOT_TILER_HOST", "127.0.0.1")
+TILER_PORT = int(os.getenv("SLR_HOTSPOT_TILER_PORT", "8766"))
+TILER_PUBLIC_URL = os.getenv("SLR_HOTSPOT_TILER_PUBLIC_URL")
+
+# Options offered by the dashboard
+SCENARIOS_IPCC = ["1-26", "2-45", "5-85"]
+SLR_YEARS = list(range(2020, 2140, 10))
+SLR_ENSEMBLE = "50.0"
+# Ensemble members (percentiles) published per scenario
+SLR_ENSEMBLES = ["5.0", "50.0", "95.0"]
+SLR_RANGE = (-90, 90)
+SUB_RANGE = (0, 14)
+# Bin widths of the hotspot histogram index (integer slider values fall on bin edges)
+SLR_BIN_WIDTH = 0.1
+SUB_BIN_WIDTH = 0.01
+
+# Values above this are treated as invalid in the hotspot statistics.
+# TODO: not needed anymore once the subsidence data has global coverage
+SANITY_THRESHOLD = 200
+
+
+def _localize(url):
+    """Path of a bucket URL in LOCAL_COG_DIR, or the URL itself when no local mirror is configured."""
+    if LOCAL_COG_DIR and url.startswith(BUCKET_URL):
+        return os.path.join(LOCAL_COG_DIR, *url[len(BUCKET_URL):].split("/"))
+    return url
+
+
+def slr_url(scenario, year, ensemble=SLR_ENSEMBLE):
+    """URL of the AR6 sea level rise COG for a scenario, year and ensemble member."""
+    return _localize(SLR_URL.format(scenario=scenario, ensemble=ensemble, year=year))
+
+
+def sub_url(tile_id):
+    """URL of the 2040 land subsidence COG tile (e.g. 'B01_x105.0_y8.0')."""
+    return _localize(SUB_URL.format(tile_id=tile_id))
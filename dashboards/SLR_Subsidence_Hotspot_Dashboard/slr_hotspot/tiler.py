@@ -0,0 +1,294 @@
+"""
+In-process XYZ tile renderer for COGs.
+
+Serves 256x256 PNG tiles (web mercator) straight from local or remote COGs,
+as an alternative to the external dynamic tiler used by leafmap's
+add_cog_layer. Low zoom levels are read from the COG overviews, values are
+coloured with the cached colormap LUT (values outside [vmin, vmax] are
+transparent, like the hotspot layers) and rendered tiles are kept in an
+in-memory LRU plus an on-disk LRU bounded to TILE_DISK_CACHE_MB.
+
+Only the dashboard's data can be rendered: COGs in the public buckets of the
+SLR and subsidence data, in LOCAL_COG_DIR, or mosaics in the cache folder.
+Any other `url` is refused, so web pages open in the same browser cannot use
+the tiler to read local files or other hosts.
+
+Run it standalone with
+
+    python -m slr_hotspot.tiler --port 8766
+
+or in the dashboard process with start_tile_server(). By default it listens on
+the loopback interface, which serves a browser on the same machine only; see
+TILER_HOST and TILER_PUBLIC_URL in slr_hotspot.sources for remote users.
+Tiles are requested as
+
+    http://localhost:8766/tiles/{z}/{x}/{y}.png?url=<cog>&cmap=viridis&vmin=-90&vmax=90
+"""
+import argparse
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+from urllib.parse import urlencode
+
+import numpy as np
+import rasterio
+from PIL import Image
+from rasterio.enums import Resampling
+from rasterio.transform import from_bounds
+from rasterio.warp import reproject, transform_bounds
+
+from slr_hotspot.cache import atomic_path
+from slr_hotspot.colormap import rgba_lut
+from slr_hotspot.mosaic import MOSAIC_DIR
+from slr_hotspot.raster import GDAL_ENV
+from slr_hotspot.sources import CACHE_DIR, LOCAL_COG_DIR, SLR_URL, SUB_URL, TILER_HOST, TILER_PORT, TILER_PUBLIC_URL
+
+TILE_SIZE = 256
+TILE_DIR = os.path.join(CACHE_DIR, "tiles")
+MEMORY_CACHE_SIZE = int(os.getenv("TILE_MEMORY_CACHE_SIZE", "2048"))
+DISK_CACHE_BYTES = int(float(os.getenv("TILE_DISK_CACHE_MB", "512")) * 1024 * 1024)
+# Remote COGs the tiler may read (bucket folders of the SLR and subsidence data)
+ALLOWED_URL_PREFIXES = tuple(url[:url.index("{")].rsplit("/", 1)[0] + "/" for url in (SLR_URL, SUB_URL))
+# Half the width of the web mercator world in metres
+ORIGIN_SHIFT = 20037508.342789244
+
+_MEMORY_CACHE = OrderedDict()
+_LOCK = threading.Lock()
+_DISK_CACHE = None  # path -> size in bytes, least recently used first
+_DISK_BYTES = 0
+_DISK_LOCK = threading.Lock()
+_EMPTY_TILE = None
+_SERVER = None
+
+
+def tile_bounds(z, x, y):
+    """Bounds (minx, miny, maxx, maxy) of an XYZ tile in EPSG:3857."""
+    size = 2 * ORIGIN_SHIFT / 2 ** z
+    minx = -ORIGIN_SHIFT + x * size
+    maxy = ORIGIN_SHIFT - y * size
+    return minx, maxy - size, minx + size, maxy
+
+
+def _within(path, directory):
+    directory = os.path.realpath(directory)
+    return os.path.commonpath([os.path.realpath(path), directory]) == directory
+
+
+def is_allowed(url):
+    """True for the COGs the tiler serves: the data buckets, LOCAL_COG_DIR and the cached mosaics."""
+    if url.startswith(("http://", "https://")):
+        return url.startswith(ALLOWED_URL_PREFIXES)
+    if "://" in url or url.startswith("/vsi"):
+        return False
+    return any(_within(url, directory) for directory in (LOCAL_COG_DIR, MOSAIC_DIR) if directory)
+
+
+def _encode_png(rgba):
+    buffer = io.BytesIO()
+    Image.fromarray(rgba, "RGBA").save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def empty_tile():
+    """Fully transparent tile, for tiles outside the raster."""
+    global _EMPTY_TILE
+    if _EMPTY_TILE is None:
+        _EMPTY_TILE = _encode_png(np.zeros((TILE_SIZE, TILE_SIZE, 4), dtype=np.uint8))
+    return _EMPTY_TILE
+
+
+def _overview_level(src, bounds):
+    """Coarsest overview level (None for full resolution) that is still finer than the tile pixels."""
+    left, bottom, right, top = transform_bounds("EPSG:3857", src.crs, *bounds)
+    tile_res = (right - left) / TILE_SIZE
+    level = None
+    for i, factor in enumerate(src.overviews(1)):
+        if src.res[0] * factor <= tile_res:
+            level = i
+    return level
+
+
+def _read_tile(url, bounds):
+    """Warp the part of a raster under a tile to a (TILE_SIZE, TILE_SIZE) float32 array (NaN = no data)."""
+    destination = np.full((TILE_SIZE, TILE_SIZE), np.nan, dtype=np.float32)
+    with rasterio.Env(**GDAL_ENV):
+        with rasterio.open(url) as src:
+            src_bounds = transform_bounds(src.crs, "EPSG:3857", *src.bounds)
+            if (bounds[0] >= src_bounds[2] or bounds[2] <= src_bounds[0]
+                    or bounds[1] >= src_bounds[3] or bounds[3] <= src_bounds[1]):
+                return None
+            level = _overview_level(src, bounds)
+        with rasterio.open(url, overview_level=level) if level is not None else rasterio.open(url) as src:
+            reproject(
+                source=rasterio.band(src, 1),
+                destination=destination,
+                src_nodata=src.nodata,
+                dst_transform=from_bounds(*bounds, TILE_SIZE, TILE_SIZE),
+                dst_crs="EPSG:3857",
+                dst_nodata=np.nan,
+                resampling=Resampling.nearest,
+            )
+    return destination
+
+
+def render_tile(url, z, x, y, cmap="viridis", vmin=0, vmax=1):
+    """PNG bytes of one XYZ tile of a COG, coloured with `cmap` over [vmin, vmax]."""
+    values = _read_tile(url, tile_bounds(z, x, y))
+    if values is None:
+        return empty_tile()
+    visible = (values >= vmin) & (values <= vmax)
+    scale = 255 / (vmax - vmin) if vmax > vmin else 0
+    index = np.clip(np.nan_to_num((values - vmin) * scale), 0, 255).astype(np.uint8)
+    rgba = rgba_lut(cmap)[index]
+    rgba[..., 3] = np.where(visible, rgba[..., 3], 0)
+    return _encode_png(rgba)
+
+
+def _disk_path(key):
+    return os.path.join(TILE_DIR, hashlib.sha1(repr(key).encode()).hexdigest() + ".png")
+
+
+def _disk_cache():
+    """Index of the disk cache, loaded on first use with the modification time as last use."""
+    global _DISK_CACHE, _DISK_BYTES
+    if _DISK_CACHE is None:
+        entries = []
+        if os.path.isdir(TILE_DIR):
+            for entry in os.scandir(TILE_DIR):
+                if entry.name.endswith(".png"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, entry.path, stat.st_size))
+        _DISK_CACHE = OrderedDict((path, size) for _, path, size in sorted(entries))
+        _DISK_BYTES = sum(_DISK_CACHE.values())
+    return _DISK_CACHE
+
+
+def _read_disk(path):
+    """PNG bytes of a cached tile (marked as recently used), or None."""
+    with _DISK_LOCK:
+        if path not in _disk_cache():
+            return None
+        _DISK_CACHE.move_to_end(path)
+    try:
+        with open(path, "rb") as f:
+            png = f.read()
+        # The modification time carries the last use over restarts
+        os.utime(path)
+        return png
+    except OSError:
+        with _DISK_LOCK:
+            _forget(path)
+        return None
+
+
+def _forget(path):
+    global _DISK_BYTES
+    _DISK_BYTES -= _DISK_CACHE.pop(path, 0)
+
+
+def _write_disk(path, png):
+    """Store a tile and evict the least recently used ones above DISK_CACHE_BYTES."""
+    global _DISK_BYTES
+    try:
+        with atomic_path(path) as tmp_path, open(tmp_path, "wb") as f:
+            f.write(png)
+    except OSError as e:
+        print(f"Error writing tile cache: {e}")
+        return
+    with _DISK_LOCK:
+        cache = _disk_cache()
+        _forget(path)
+        cache[path] = len(png)
+        _DISK_BYTES += len(png)
+        while _DISK_BYTES > DISK_CACHE_BYTES and len(cache) > 1:
+            old_path = next(iter(cache))
+            _forget(old_path)
+            try:
+                os.remove(old_path)
+            except OSError:
+                pass
+
+
+def get_tile(url, z, x, y, cmap="viridis", vmin=0, vmax=1):
+    """Tile from the memory LRU, then the disk LRU, rendering it on a miss."""
+    if not is_allowed(url):
+        raise PermissionError(f"The tiler does not serve {url}")
+    key = (url, z, x, y, cmap, float(vmin), float(vmax))
+    with _LOCK:
+        if key in _MEMORY_CACHE:
+            _MEMORY_CACHE.move_to_end(key)
+            return _MEMORY_CACHE[key]
+    path = _disk_path(key)
+    png = _read_disk(path)
+    if png is None:
+        png = render_tile(url, z, x, y, cmap, vmin, vmax)
+        _write_disk(path, png)
+    with _LOCK:
+        _MEMORY_CACHE[key] = png
+        while len(_MEMORY_CACHE) > MEMORY_CACHE_SIZE:
+            _MEMORY_CACHE.popitem(last=False)
+    return png
+
+
+def tile_url_template(tiler_url, url, cmap, vmin, vmax):
+    """XYZ URL template for leaflet, pointing at a running tile server."""
+    query = urlencode({"url": url, "cmap": cmap, "vmin": vmin, "vmax": vmax})
+    return f"{tiler_url.rstrip('/')}/tiles/{{z}}/{{x}}/{{y}}.png?{query}"
+
+
+def create_app():
+    """Starlette app serving /tiles/{z}/{x}/{y}.png."""
+    from starlette.applications import Starlette
+    from starlette.concurrency import run_in_threadpool
+    from starlette.middleware import Middleware
+    from starlette.middleware.cors import CORSMiddleware
+    from starlette.responses import Response
+    from starlette.routing import Route
+
+    async def tile(request):
+        params = request.query_params
+        if not is_allowed(params.get("url", "")):
+            return Response("url not served by this tiler", status_code=403)
+        png = await run_in_threadpool(
+            get_tile,
+            params["url"],
+            request.path_params["z"],
+            request.path_params["x"],
+            request.path_params["y"],
+            params.get("cmap", "viridis"),
+            float(params.get("vmin", 0)),
+            float(params.get("vmax", 1)),
+        )
+        return Response(png, media_type="image/png", headers={"Cache-Control": "max-age=86400"})
+
+    return Starlette(
+        routes=[Route("/tiles/{z:int}/{x:int}/{y:int}.png", tile)],
+        middleware=[Middleware(CORSMiddleware, allow_origins=["*"])],
+    )
+
+
+def start_tile_server(host=TILER_HOST, port=TILER_PORT, public_url=TILER_PUBLIC_URL):
+    """
+    Start the tile server in a daemon thread of the current process (once) and
+    return the URL the browsers request tiles from: `public_url`, or the listen
+    address when unset (reachable from the dashboard machine only).
+    """
+    global _SERVER
+    if _SERVER is None:
+        import uvicorn
+
+        _SERVER = uvicorn.Server(uvicorn.Config(create_app(), host=host, port=port, log_level="warning"))
+        threading.Thread(target=_SERVER.run, daemon=True).start()
+    return public_url.rstrip("/") if public_url else f"http://{host}:{port}"
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Serve XYZ PNG tiles from COGs.")
+    parser.add_argument("--host", default=TILER_HOST)
+    parser.add_argument("--port", type=int, default=TILER_PORT)
+    args = parser.parse_args()
+    uvicorn.run(create_app(), host=args.host, port=args.port)
@@ -0,0 +1,72 @@
+"""
+Spatial index of the 3 degree land subsidence COG tiles (stac_metadata.geojson).
+
+The tile footprints are loaded once (from the reference data cache) and put in
+an STRtree, so point and bounding box lookups take logarithmic time instead of
+intersecting every tile footprint on each render. A plain grid computation from the `B01_x{lon}_y{lat}`
+ids is not used because part of the tiles is offset from the regular grid.
+"""
+import geopandas as gpd
+import numpy as np
+from shapely import STRtree, box, points
+
+from slr_hotspot.reference_data import load_tiles
+
+_TILE_INDEX = None
+
+
+class TileIndex:
+    """Point-to-tile and bbox-to-tiles queries over tile footprints in EPSG:4326."""
+
+    def __init__(self, gdf):
+        if gdf.crs is None:
+            gdf = gdf.set_crs(4326)
+        elif gdf.crs.to_epsg() != 4326:
+            gdf = gdf.to_crs(4326)
+        self.crs = gdf.crs
+        self.ids = gdf["id"].to_numpy()
+        self.geometries = gdf.geometry.to_numpy()
+        self.tree = STRtree(self.geometries)
+
+    def _ids(self, positions):
+        return sorted(self.ids[np.asarray(positions, dtype=int)].tolist())
+
+    def point_to_tile(self, lon, lat):
+        """Id of the tile containing a point, or None when no tile covers it."""
+        ids = self._ids(self.tree.query(points(lon, lat), predicate="intersects"))
+        return ids[0] if ids else None
+
+    def bbox_to_tiles(self, minx, miny, maxx, maxy):
+        """Ids of all tiles intersecting a lon/lat bounding box."""
+        return self._ids(self.tree.query(box(minx, miny, maxx, maxy), predicate="intersects"))
+
+    def geometry_to_tiles(self, geometry, crs=None):
+        """Ids of all tiles intersecting a geometry (reprojected from `crs` when given)."""
+        if crs is not None:
+            geometry = gpd.GeoSeries([geometry], crs=crs).to_crs(self.crs).iloc[0]
+        return self._ids(self.tree.query(geometry, predicate="intersects"))
+
+
+def get_tile_index():
+    """Tile index of the subsidence collection, built once per process."""
+    global _TILE_INDEX
+    if _TILE_INDEX is None:
+        _TILE_INDEX = TileIndex(load_tiles())
+    return _TILE_INDEX
+
+
+def delta_tiles(gdf):
+    """
+    Subsidence tiles of a delta GeoDataFrame.
+
+    Returns (main tile id, all tile ids), where the main tile contains the
+    delta centroid and the list holds every tile the delta polygons touch.
+    """
+    index = get_tile_index()
+    gdf = gdf.to_crs(index.crs)
+    tile_ids = sorted({tile for geom in gdf.geometry for tile in index.geometry_to_tiles(geom)})
+    centroid = gdf.geometry.union_all().centroid
+    main_id = index.point_to_tile(centroid.x, centroid.y)
+    if main_id is None and tile_ids:
+        main_id = tile_ids[0]
+    return main_id, tile_ids
@@ -0,0 +1,59 @@
+"""
+Sea level rise trajectory of a delta over all projection years.
+
+The years of a scenario are separate COGs. They are reduced to delta
+statistics concurrently, one thread per year, so the time to build the curve
+is close to the slowest single read instead of the sum of all reads. Each
+year goes through the statistics catalog and the histogram index, so repeated
+curves (other slider ranges, same delta) do not read the rasters again.
+
+When an SLR datacube covering the delta was ingested (slr_hotspot.datacube),
+the curve is computed from its chunks instead, without opening any COG.
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+from matplotlib.figure import Figure
+
+from slr_hotspot.catalog import cached_stats
+from slr_hotspot.datacube import open_datacube
+from slr_hotspot.histogram import indexed_hotspot_stats
+from slr_hotspot.sources import SLR_BIN_WIDTH, SLR_RANGE, SLR_YEARS, slr_url
+
+
+def slr_timeseries(scenario, zone, geometries, crs, value_range=SLR_RANGE, years=SLR_YEARS):
+    """
+    Hotspot statistics of a delta for every projection year of a scenario.
+
+    Returns a DataFrame indexed by year with the raster_stats columns
+    (count, mean, min, max, std).
+    """
+    value_range = tuple(value_range)
+    cube = open_datacube()
+    if cube is not None and list(years) == cube.years and cube.covers(scenario, geometries=geometries, crs=crs):
+        return cube.aoi_timeseries(scenario, geometries, crs, value_range)
+
+    def year_stats(year):
+        url = slr_url(scenario, year)
+        return cached_stats(url, zone, value_range, compute=lambda: indexed_hotspot_stats(url, zone, geometries, crs, value_range, SLR_RANGE, SLR_BIN_WIDTH))
+
+    # Reads are latency bound, so all years are fetched at once
+    with ThreadPoolExecutor(max_workers=max(len(years), 1)) as pool:
+        rows = list(pool.map(year_stats, years))
+    return pd.DataFrame(rows, index=pd.Index(list(years), name="year"))
+
+
+def plot_timeseries(df, title, unit="mm"):
+    """Figure of the mean per year with the min-max range as a band."""
+    # Bare Figure (no pyplot) so plots can be made from worker threads
+    fig = Figure(figsize=(6, 3))
+    ax = fig.add_subplot()
+    ax.fill_between(df.index, df["min"], df["max"], alpha=0.25, label="min - max")
+    ax.plot(df.index, df["mean"], marker="o", label="mean")
+    ax.set_title(title)
+    ax.set_xlabel("Year")
+    ax.set_ylabel(f"SLR [{unit}]")
+    ax.grid(True, alpha=0.3)
+    ax.legend(loc="upper left")
+    fig.tight_layout()
+    return fig
@@ -0,0 +1,176 @@
+"""
+Zonal statistics of all deltas in a single pass over a raster.
+
+The delta polygons are rasterized once per raster grid into a label grid
+(0 = outside all deltas, i = i-th zone), stored only for the raster blocks
+that intersect a delta. The grid is keyed by whole raster blocks, so every
+pixel is in exactly one window even when the bounding box of one zone
+overlaps another zone. Statistics of every zone are then computed in one
+block-streamed pass over just those blocks, with bincount reductions per
+block. Label grids are cached in memory and on disk, keyed by the grid and
+the zones, so all SLR scenarios and years (same grid) share one label grid.
+"""
+import hashlib
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+import rasterio
+from rasterio.features import rasterize
+from rasterio.warp import transform_geom
+from rasterio.windows import Window
+
+from slr_hotspot.cache import atomic_path
+from slr_hotspot.raster import GDAL_ENV, MAX_WORKERS, block_windows, reduce_blocks, shapes_window
+from slr_hotspot.sources import CACHE_DIR, SANITY_THRESHOLD
+
+ZONES_DIR = os.path.join(CACHE_DIR, "zones")
+# Part of the label grid key; bump when the layout of the grids changes
+LABEL_GRID_VERSION = 2
+
+_LABEL_GRIDS = {}
+_LOCK = threading.Lock()
+
+
+def _window_key(window):
+    return f"{int(window.col_off)}_{int(window.row_off)}_{int(window.width)}_{int(window.height)}"
+
+
+def _intersects(a, b):
+    return (a.col_off < b.col_off + b.width and b.col_off < a.col_off + a.width
+            and a.row_off < b.row_off + b.height and b.row_off < a.row_off + a.height)
+
+
+def label_grid_key(src, zones, band=1):
+    """Key of the label grid of `zones` (GeoSeries) on the grid of `src`."""
+    h = hashlib.sha1()
+    h.update(str(LABEL_GRID_VERSION).encode())
+    h.update(src.crs.to_wkt().encode())
+    h.update(repr((tuple(src.transform)[:6], src.width, src.height, src.block_shapes[band - 1])).encode())
+    for geometry in zones.to_crs(4326).geometry:
+        h.update(geometry.wkb)
+    return h.hexdigest()
+
+
+def build_label_grid(src, zones, band=1):
+    """
+    {window key: uint16 labels} for the blocks of `src` intersecting `zones`.
+
+    Labels are 1 + the position of the zone in `zones`; pixels are assigned by
+    their centre, like the single-delta clip. Zones are expected not to
+    overlap: a pixel inside several zones gets the label of the last one, so
+    it counts for that zone only.
+    """
+    shapes = [transform_geom(zones.crs, src.crs, geometry.__geo_interface__) for geometry in zones.geometry]
+    zone_windows = [window for window in (shapes_window(src, [shape]) for shape in shapes) if window is not None]
+    # Whole blocks, not blocks cropped per zone: cropped windows of different zones can overlap
+    windows = {
+        _window_key(window): window
+        for window in block_windows(src, band)
+        if any(_intersects(window, zone_window) for zone_window in zone_windows)
+    }
+    labels = {}
+    for key, window in windows.items():
+        grid = rasterize(
+            [(shape, i + 1) for i, shape in enumerate(shapes)],
+            out_shape=(int(window.height), int(window.width)),
+            transform=src.window_transform(window),
+            fill=0,
+            dtype="uint16",
+        )
+        if grid.any():
+            labels[key] = grid
+    return labels
+
+
+def get_label_grid(src, zones, band=1):
+    """Label grid of `zones` on the grid of `src`: from memory, from disk, or rasterized once."""
+    key = label_grid_key(src, zones, band)
+    with _LOCK:
+        labels = _LABEL_GRIDS.get(key)
+    if labels is None:
+        path = os.path.join(ZONES_DIR, f"{key}.npz")
+        if os.path.exists(path):
+            with np.load(path) as data:
+                labels = {name: data[name] for name in data.files}
+        else:
+            labels = build_label_grid(src, zones, band)
+            try:
+                with atomic_path(path) as tmp_path, open(tmp_path, "wb") as f:
+                    np.savez_compressed(f, **labels)
+            except OSError as e:
+                print(f"Error writing label grid cache: {e}")
+        with _LOCK:
+            _LABEL_GRIDS[key] = labels
+    return labels
+
+
+def _empty(n):
+    return {
+        "count": np.zeros(n, dtype=np.int64),
+        "sum": np.zeros(n),
+        "squares": np.zeros(n),
+        "min": np.full(n, np.inf),
+        "max": np.full(n, -np.inf),
+    }
+
+
+def _merge(a, b):
+    for name in ("count", "sum", "squares"):
+        a[name] += b[name]
+    np.minimum(a["min"], b["min"], out=a["min"])
+    np.maximum(a["max"], b["max"], out=a["max"])
+    return a
+
+
+def zonal_stats(url, zones, names=None, value_range=None, threshold=SANITY_THRESHOLD, band=1, max_workers=MAX_WORKERS):
+    """
+    Per-zone count, sum, mean, min, max and std of a raster in one pass.
+
+    `zones` is a GeoDataFrame/GeoSeries of polygons and `names` their labels
+    (default: the index). Only valid pixels, within `value_range` when given
+    and not above `threshold`, are counted. Returns a DataFrame indexed by zone.
+    """
+    names = list(zones.index if names is None else names)
+    n = len(names) + 1  # label 0 is "no zone"
+    with rasterio.Env(**GDAL_ENV), rasterio.open(url) as src:
+        labels = get_label_grid(src, zones, band)
+        windows = [Window(*map(int, key.split("_"))) for key in labels]
+
+    def func(block, window, nodata):
+        zone = labels[_window_key(window)]
+        keep = zone > 0
+        if np.issubdtype(block.dtype, np.floating):
+            keep &= ~np.isnan(block)
+        if nodata is not None and not np.isnan(nodata):
+            keep &= block != nodata
+        keep &= block <= threshold
+        if value_range is not None:
+            keep &= (block >= value_range[0]) & (block <= value_range[1])
+        zone, values = zone[keep], block[keep].astype(np.float64)
+        part = _empty(n)
+        part["count"] = np.bincount(zone, minlength=n)
+        part["sum"] = np.bincount(zone, weights=values, minlength=n)
+        part["squares"] = np.bincount(zone, weights=values * values, minlength=n)
+        np.minimum.at(part["min"], zone, values)
+        np.maximum.at(part["max"], zone, values)
+        return part
+
+    totals = reduce_blocks(url, windows, func, _merge, band, max_workers) or _empty(n)
+    count = totals["count"][1:]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = totals["sum"][1:] / count
+        std = np.sqrt(np.maximum(totals["squares"][1:] / count - mean ** 2, 0))
+    empty = count == 0
+    return pd.DataFrame(
+        {
+            "count": count,
+            "sum": totals["sum"][1:],
+            "mean": mean,
+            "min": np.where(empty, np.nan, totals["min"][1:]),
+            "max": np.where(empty, np.nan, totals["max"][1:]),
+            "std": std,
+        },
+        index=pd.Index(names, name="zone"),
+    )
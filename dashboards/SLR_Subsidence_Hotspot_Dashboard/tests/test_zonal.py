@@ -0,0 +1,53 @@
+import geopandas as gpd
+import numpy as np
+import pytest
+import rasterio
+from rasterio.transform import from_origin
+from shapely.geometry import Polygon, box
+
+from slr_hotspot import zonal
+from slr_hotspot.raster import hotspot_stats
+from slr_hotspot.zonal import zonal_stats
+
+SIZE = 64
+BLOCK = 16
+
+
+@pytest.fixture
+def raster(tmp_path, monkeypatch):
+    monkeypatch.setattr(zonal, "ZONES_DIR", str(tmp_path / "zones"))
+    monkeypatch.setattr(zonal, "_LABEL_GRIDS", {})
+    path = tmp_path / "values.tif"
+    values = np.random.default_rng(0).uniform(0, 100, (SIZE, SIZE)).astype("float32")
+    profile = {
+        "driver": "GTiff",
+        "width": SIZE,
+        "height": SIZE,
+        "count": 1,
+        "dtype": "float32",
+        "crs": "EPSG:4326",
+        "transform": from_origin(0, SIZE, 1, 1),
+        "nodata": -9999,
+        "tiled": True,
+        "blockxsize": BLOCK,
+        "blockysize": BLOCK,
+    }
+    with rasterio.open(path, "w", **profile) as dst:
+        dst.write(values, 1)
+    return str(path)
+
+
+def test_zonal_stats_matches_single_zone_stats_for_overlapping_bboxes(raster):
+    # The bbox of the L-shaped zone A contains zone B
+    zone_a = Polygon([(2, 2), (50, 2), (50, 20), (20, 20), (20, 50), (2, 50)])
+    zone_b = box(30, 30, 46, 46)
+    zones = gpd.GeoDataFrame({"name": ["A", "B"]}, geometry=[zone_a, zone_b], crs="EPSG:4326").set_index("name")
+
+    table = zonal_stats(raster, zones)
+
+    for name in zones.index:
+        expected = hotspot_stats(raster, [zones.geometry[name]], "EPSG:4326", (-np.inf, np.inf))
+        assert table.loc[name, "count"] == expected["count"]
+        assert table.loc[name, "mean"] == pytest.approx(expected["mean"])
+        assert table.loc[name, "min"] == pytest.approx(expected["min"])
+        assert table.loc[name, "max"] == pytest.approx(expected["max"])
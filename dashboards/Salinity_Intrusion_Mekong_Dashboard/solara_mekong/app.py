@@ -3,6 +3,10 @@ import solara
 from solara_mekong.pages.home import Page as home_page
 from solara_mekong.pages.hazard import Page as hazard_page
 from solara_mekong.pages.impact import Page as impact_page
+from solara_mekong.utils.general import warm_up
+
+# Open the STAC catalog, GCS filesystem and impacts table in the background at server start
+warm_up()
 
 title = "Salinity Intrusion Dashboard for Mekong Delta"
 
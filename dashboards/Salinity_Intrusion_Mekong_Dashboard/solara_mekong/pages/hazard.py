@@ -1,6 +1,7 @@
 import solara
 
 from solara_mekong.utils.general import (
+    cached_legend_image,
     get_wms_config,
     get_isoline_gdf,
     RCP_OPTIONS,
@@ -13,6 +14,7 @@ from solara_mekong.utils.general import (
 )
 
 from solara_mekong.utils.map import Map
+from solara_mekong.utils.prefetch import Prefetcher
 
 zoom = solara.reactive(8)
 center = solara.reactive((10, 105.7))  # Mekong Delta coordinates
@@ -28,6 +30,9 @@ show_isoline = solara.reactive(False)
 # Map instance to track across reactive updates
 map_instance = solara.reactive(None)
 
+# Prefetches of this session (see utils.prefetch)
+prefetcher = solara.reactive(None)
+
 # Reactive legend URL for WMS colorbar
 legend_url = solara.reactive(None)
 
@@ -65,11 +70,16 @@ def get_anthropogenic_description():
     
     return " ".join(descriptions)
 
+def current_selection():
+    return (climate_rcp.value, year.value, subsidence_enabled.value, riverbed_enabled.value, show_isoline.value)
+
 # Update map when any scenario parameter changes (not opacity)
 def update_map_layer():
     if map_instance.value:
         is_updating.set(True)  # Show loading
         try:
+            # A prefetch of this selection may be loading it already (see utils.prefetch)
+            prefetcher.value.wait_for(current_selection())
             # Update WMS layer
             config = get_wms_config(climate_rcp.value, year.value, subsidence_enabled.value, riverbed_enabled.value)
             map_instance.value.add_wms_layer_general(config, layer_name="Salinity WMS", opacity_value=opacity.value)
@@ -82,12 +92,15 @@ def update_map_layer():
                         isoline_gdf,
                         layer_name="2 PSU Isoline",
                         style=ISOLINE_STYLE,
-                        hover_style=ISOLINE_STYLE
+                        hover_style=ISOLINE_STYLE,
+                        lod=True,
                     )
             # Set legend_url reactive
             legend_url.set(map_instance.value.legend_url)
         finally:
             is_updating.set(False)  # Hide loading  
+        # Warm the caches for the adjacent years and available switches
+        prefetcher.value.prefetch_neighbours(*current_selection())
 
 # Only update opacity when slider changes
 def update_opacity():
@@ -98,6 +111,10 @@ def update_opacity():
                     
 @solara.component
 def Page():
+    if prefetcher.value is None:
+        prefetcher.set(Prefetcher())
+    # Queued prefetches of this session are dropped when the page goes away
+    solara.use_effect(lambda: prefetcher.value.cancel, [])
     # Create map instance if it doesn't exist
     if map_instance.value is None:
         new_map = Map(
@@ -120,7 +137,8 @@ def Page():
                     isoline_gdf,
                     layer_name="2 PSU Isoline",
                     style=ISOLINE_STYLE,
-                    hover_style=ISOLINE_STYLE
+                    hover_style=ISOLINE_STYLE,
+                    lod=True,
                 )
         map_instance.set(new_map)
         # Set legend_url reactive
@@ -236,9 +254,9 @@ def Page():
                         <span style="font-size:13px;vertical-align:middle;margin-left:6px;">2 PSU Isoline</span>
                         </span>''',
                     )
-                # Always show raster legend image if available
+                # Always show raster legend image if available (prefetched PNG, else the URL)
                 if legend_url.value:
-                    solara.Image(legend_url.value)
+                    solara.Image(cached_legend_image(legend_url.value) or legend_url.value)
         solara.Info(
                 """
                 In this page you can explore the projected salinity intrusion in the Mekong Delta for the years 2030, 2040 and 2050 under different scenarios.
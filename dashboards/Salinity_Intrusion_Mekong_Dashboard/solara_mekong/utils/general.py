@@ -1,29 +1,36 @@
 import numpy as np
 import pandas as pd
 from pathlib import Path
-from pystac_client import Client
 import geopandas as gpd
-import gcsfs
 import os
+import shapely
+import hashlib
+import io
+import json
+import requests
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from pyarrow import feather
 # Impact data
 
 PROVINCES_SHP = os.path.join(os.path.dirname(__file__), "..", "data", "provc.geojson")
 PROVINCES_IMPACTS = os.path.join(os.path.dirname(__file__), "..", "data", "production_value_2050.csv")
-
-gdf = gpd.read_file(PROVINCES_SHP).to_crs("EPSG:4326")
-impacts = pd.read_csv(PROVINCES_IMPACTS)
-IMPACTS_GDF = gdf.merge(impacts, left_on='Name', right_on='Province', how='left')
-
-# Create GCS filesystem (anonymous for public bucket)
-fs = gcsfs.GCSFileSystem(anonymous=True)
-
-# Open catalog
-catalog = Client.open(
-    "https://storage.googleapis.com/gca-data-public/gca/gca-stac-4/catalog.json"
-)
-# Choose a collection
-sal_collection = catalog.get_collection("Salinity" )
-sal_incr_collection = catalog.get_collection("Salinity Increase" )
+# Provinces reprojected to EPSG:4326 and merged with the impacts, as an uncompressed Arrow file
+IMPACTS_CACHE = os.path.join(os.path.dirname(__file__), "..", "data", "cache", "impacts_2050.arrow")
+# Raw isoline parquet files, one per object version (see get_cached_parquet)
+ISOLINE_CACHE_DIR = os.path.join(os.path.dirname(__file__), "..", "data", "cache", "isolines")
+# Decoded isoline GeoDataFrames kept in memory
+ISOLINE_MEMORY_CACHE_SIZE = int(os.getenv("ISOLINE_MEMORY_CACHE_SIZE", "16"))
+# Seconds a cached isoline is served before its object version is checked again
+ISOLINE_VALIDATE_SECONDS = float(os.getenv("ISOLINE_VALIDATE_SECONDS", "300"))
+# Legend PNGs (GetLegendGraphic responses) kept in memory
+LEGEND_CACHE_SIZE = 64
+
+STAC_CATALOG_URL = "https://storage.googleapis.com/gca-data-public/gca/gca-stac-4/catalog.json"
+# Seconds before the STAC item index of a collection is reloaded
+STAC_INDEX_TTL = float(os.getenv("STAC_INDEX_TTL", "3600"))
 
 # Remote Deltares GeoServer (baseline absolute salinity WMS)
 REMOTE_GEOSERVER_URL = os.getenv(
@@ -132,6 +139,294 @@ DEFAULT_TEXT = {
 
 
 
+# Remote resources (GCS filesystem, STAC catalog and collections) and the impacts table are
+# created on first use, so importing the package does no network round trips. warm_up()
+# (called by app.py at server start) loads them in background threads.
+def _open_fs():
+    import gcsfs
+    # Anonymous for the public bucket
+    return gcsfs.GCSFileSystem(anonymous=True)
+
+
+def _open_catalog():
+    from pystac_client import Client
+    return Client.open(STAC_CATALOG_URL)
+
+
+_RESOURCE_FACTORIES = {
+    "fs": _open_fs,
+    "catalog": _open_catalog,
+    "sal_collection": lambda: get_resource("catalog").get_collection("Salinity"),
+    "sal_incr_collection": lambda: get_resource("catalog").get_collection("Salinity Increase"),
+    "impacts": lambda: _read_impacts_gdf(),
+}
+_RESOURCES = {}
+_RESOURCE_STATUS = {name: "pending" for name in _RESOURCE_FACTORIES}
+_RESOURCE_LOCKS = {name: threading.Lock() for name in _RESOURCE_FACTORIES}
+
+
+def get_resource(name):
+    """Shared resource `name` (see _RESOURCE_FACTORIES), created once on first use."""
+    if name not in _RESOURCES:
+        with _RESOURCE_LOCKS[name]:
+            if name not in _RESOURCES:
+                _RESOURCE_STATUS[name] = "loading"
+                try:
+                    _RESOURCES[name] = _RESOURCE_FACTORIES[name]()
+                except Exception as e:
+                    _RESOURCE_STATUS[name] = f"error: {e}"
+                    raise
+                _RESOURCE_STATUS[name] = "ready"
+    return _RESOURCES[name]
+
+
+def resource_status():
+    """Readiness of the shared resources: {name: "pending" | "loading" | "ready" | "error: ..."}."""
+    return dict(_RESOURCE_STATUS)
+
+
+def resources_ready():
+    return all(status == "ready" for status in _RESOURCE_STATUS.values())
+
+
+def _warm(name):
+    try:
+        get_resource(name)
+    except Exception as e:
+        print(f"Error loading {name}: {e}")
+
+
+def warm_up(names=None):
+    """Load the shared resources (and the STAC item indexes) in background (daemon) threads; returns immediately."""
+    for name in names or _RESOURCE_FACTORIES:
+        if _RESOURCE_STATUS[name] == "pending":
+            threading.Thread(target=_warm, args=(name,), name=f"warm-{name}", daemon=True).start()
+    if names is None:
+        for collection in _INDEXED_COLLECTIONS:
+            threading.Thread(target=_warm_index, args=(collection,), name=f"warm-{collection}-index", daemon=True).start()
+
+
+def __getattr__(name):
+    # Backwards compatible module attributes (general.fs, general.catalog, ...)
+    if name in _RESOURCE_FACTORIES:
+        return get_resource(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# STAC item indexes: all items of a collection loaded at once, assets kept as
+# {item id: {asset key: {"href", "title"}}} so scenario switches need no STAC requests.
+_INDEXED_COLLECTIONS = ["sal_collection", "sal_incr_collection"]
+_ITEM_INDEXES = {}  # collection resource name -> (loaded at, index)
+_ITEM_INDEX_LOCK = threading.Lock()
+_ITEM_INDEX_REFRESHING = set()
+
+
+def _gcs_url(href):
+    """gcs:// URL of a public storage.googleapis.com href (read through the shared GCS filesystem)."""
+    return f"gcs://{href.replace('https://storage.googleapis.com/', '')}"
+
+
+def _compact_assets(assets):
+    if isinstance(assets, str):
+        assets = json.loads(assets)
+    return {
+        key: {"href": asset.get("href"), "title": asset.get("title")}
+        for key, asset in (assets or {}).items()
+        if asset is not None
+    }
+
+
+def _load_item_index(collection_name):
+    """Item index of a collection, from its geoparquet-stac-items asset or else by listing the items."""
+    collection = get_resource(collection_name)
+    parquet_asset = collection.get_assets().get("geoparquet-stac-items")
+    if parquet_asset is not None:
+        try:
+            href = parquet_asset.href
+            if href.startswith("https://storage.googleapis.com/"):
+                items = pd.read_parquet(_gcs_url(href), columns=["id", "assets"], filesystem=get_resource("fs"))
+            else:
+                items = pd.read_parquet(href, columns=["id", "assets"])
+            return {item_id: _compact_assets(assets) for item_id, assets in zip(items["id"], items["assets"])}
+        except Exception as e:
+            print(f"Error reading geoparquet items of {collection_name}, listing items instead: {e}")
+    return {
+        item.id: {key: {"href": asset.href, "title": asset.title} for key, asset in item.assets.items()}
+        for item in collection.get_items()
+    }
+
+
+def _refresh_item_index(collection_name):
+    try:
+        index = _load_item_index(collection_name)
+        with _ITEM_INDEX_LOCK:
+            _ITEM_INDEXES[collection_name] = (time.monotonic(), index)
+    except Exception as e:
+        print(f"Error refreshing item index of {collection_name}: {e}")
+    finally:
+        with _ITEM_INDEX_LOCK:
+            _ITEM_INDEX_REFRESHING.discard(collection_name)
+
+
+def get_item_index(collection_name="sal_incr_collection"):
+    """
+    {item id: assets} of a collection. Loaded on first use; after STAC_INDEX_TTL
+    the stale index is still served while a background thread reloads it.
+    """
+    with _ITEM_INDEX_LOCK:
+        entry = _ITEM_INDEXES.get(collection_name)
+        expired = entry is not None and time.monotonic() - entry[0] > STAC_INDEX_TTL
+        if expired and collection_name not in _ITEM_INDEX_REFRESHING:
+            _ITEM_INDEX_REFRESHING.add(collection_name)
+            threading.Thread(target=_refresh_item_index, args=(collection_name,), daemon=True).start()
+    if entry is None:
+        index = _load_item_index(collection_name)
+        with _ITEM_INDEX_LOCK:
+            entry = _ITEM_INDEXES.setdefault(collection_name, (time.monotonic(), index))
+    return entry[1]
+
+
+def _warm_index(collection_name):
+    try:
+        get_item_index(collection_name)
+    except Exception as e:
+        print(f"Error loading item index of {collection_name}: {e}")
+
+
+def get_item_assets(item_id, collection_name="sal_incr_collection"):
+    """Assets ({key: {"href", "title"}}) of an item, from the item index (one STAC request if it is not indexed)."""
+    assets = get_item_index(collection_name).get(item_id)
+    if assets is None:
+        item = get_resource(collection_name).get_item(item_id)
+        if item is None:
+            raise KeyError(f"No item {item_id} in {collection_name}")
+        assets = {key: {"href": asset.href, "title": asset.title} for key, asset in item.assets.items()}
+    return assets
+
+
+# Isoline cache: decoded GeoDataFrames in a memory LRU, raw parquet bytes on disk.
+# Both tiers are keyed by URL and validated against the GCS object generation (or ETag).
+_ISOLINES = OrderedDict()  # url -> (version, validated at, GeoDataFrame)
+_ISOLINE_LOCK = threading.Lock()
+# One lock per URL: the page and the prefetch threads download, read and replace its files in turn
+_ISOLINE_URL_LOCKS = {}
+_ISOLINE_STATS = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stale_hits": 0}
+
+
+def _count(name):
+    with _ISOLINE_LOCK:
+        _ISOLINE_STATS[name] += 1
+
+
+def isoline_cache_stats():
+    """Hit/miss counters of the isoline cache, plus the number of entries in memory."""
+    with _ISOLINE_LOCK:
+        return {**_ISOLINE_STATS, "memory_entries": len(_ISOLINES)}
+
+
+def _object_version(url):
+    """Generation (or ETag / MD5) of a GCS object; changes whenever the object is rewritten."""
+    info = get_resource("fs").info(url)
+    version = info.get("generation") or info.get("etag") or info.get("md5Hash")
+    if version is None:
+        raise ValueError(f"No generation or ETag for {url}")
+    return hashlib.sha1(str(version).encode()).hexdigest()[:16]
+
+
+def _disk_files(url):
+    key = hashlib.sha1(url.encode()).hexdigest()[:16]
+    if not os.path.isdir(ISOLINE_CACHE_DIR):
+        return key, []
+    return key, [name for name in os.listdir(ISOLINE_CACHE_DIR) if name.startswith(f"{key}_") and name.endswith(".parquet")]
+
+
+def _url_lock(url):
+    with _ISOLINE_LOCK:
+        return _ISOLINE_URL_LOCKS.setdefault(url, threading.Lock())
+
+
+def _write_isoline(path, data, old_files):
+    """Write the parquet bytes of a new object version and drop the files of older versions."""
+    os.makedirs(ISOLINE_CACHE_DIR, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=ISOLINE_CACHE_DIR, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except OSError:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    for name in old_files:
+        os.remove(os.path.join(ISOLINE_CACHE_DIR, name))
+
+
+def _remember(url, version, gdf):
+    with _ISOLINE_LOCK:
+        _ISOLINES[url] = (version, time.monotonic(), gdf)
+        _ISOLINES.move_to_end(url)
+        while len(_ISOLINES) > ISOLINE_MEMORY_CACHE_SIZE:
+            _ISOLINES.popitem(last=False)
+
+
+def get_cached_parquet(url):
+    """
+    GeoDataFrame of a parquet object on GCS (gcs:// URL) through the two cache tiers.
+
+    Memory entries are served without a request for ISOLINE_VALIDATE_SECONDS,
+    then revalidated with one metadata request. The bytes are downloaded only
+    when neither tier holds the current object version. When the version
+    cannot be checked (offline), the last cached copy is served.
+    """
+    with _ISOLINE_LOCK:
+        entry = _ISOLINES.get(url)
+        if entry is not None:
+            _ISOLINES.move_to_end(url)
+    if entry is not None and time.monotonic() - entry[1] < ISOLINE_VALIDATE_SECONDS:
+        _count("memory_hits")
+        return entry[2]
+
+    with _url_lock(url):
+        # Another thread may have loaded this URL while we waited
+        with _ISOLINE_LOCK:
+            entry = _ISOLINES.get(url, entry)
+        if entry is not None and time.monotonic() - entry[1] < ISOLINE_VALIDATE_SECONDS:
+            _count("memory_hits")
+            return entry[2]
+        key, files = _disk_files(url)
+        try:
+            version = _object_version(url)
+        except Exception as e:
+            if entry is None and not files:
+                raise
+            print(f"Error validating cached isoline {url}, serving the cached copy: {e}")
+            _count("stale_hits")
+            if entry is not None:
+                return entry[2]
+            return gpd.read_parquet(os.path.join(ISOLINE_CACHE_DIR, files[0]))
+
+        if entry is not None and entry[0] == version:
+            _count("memory_hits")
+            _remember(url, version, entry[2])
+            return entry[2]
+
+        path = os.path.join(ISOLINE_CACHE_DIR, f"{key}_{version}.parquet")
+        if os.path.basename(path) in files:
+            _count("disk_hits")
+            gdf = gpd.read_parquet(path)
+        else:
+            _count("misses")
+            data = get_resource("fs").cat_file(url)
+            try:
+                # Older versions of the object are no longer needed
+                _write_isoline(path, data, files)
+            except OSError as e:
+                print(f"Error writing isoline cache: {e}")
+            gdf = gpd.read_parquet(io.BytesIO(data))
+        _remember(url, version, gdf)
+        return gdf
+
+
 # Utility to build item_id for scenario
 def _get_item_id(rcp, year_val, subsidence, riverbed):
     year_str = str(year_val)
@@ -157,14 +452,42 @@ def _make_legend_url(wms_base: str, layer: str) -> str:
     )
 
 
+_LEGENDS = OrderedDict()  # legend url -> PNG bytes
+_LEGEND_LOCK = threading.Lock()
+
+
+def get_legend_image(legend_url):
+    """PNG bytes of a legend URL, downloaded once and kept in memory (None on error)."""
+    with _LEGEND_LOCK:
+        if legend_url in _LEGENDS:
+            _LEGENDS.move_to_end(legend_url)
+            return _LEGENDS[legend_url]
+    try:
+        response = requests.get(legend_url, timeout=30)
+        response.raise_for_status()
+    except Exception as e:
+        print(f"Error getting legend {legend_url}: {e}")
+        return None
+    with _LEGEND_LOCK:
+        _LEGENDS[legend_url] = response.content
+        while len(_LEGENDS) > LEGEND_CACHE_SIZE:
+            _LEGENDS.popitem(last=False)
+    return response.content
+
+
+def cached_legend_image(legend_url):
+    """PNG bytes of a legend already in memory, else None (never makes a request)."""
+    with _LEGEND_LOCK:
+        return _LEGENDS.get(legend_url)
+
+
 # Get WMS config dict for scenario (remote STAC visual asset -> Deltares GeoServer)
 def get_wms_config(rcp, year_val, subsidence, riverbed):
     item_id = _get_item_id(rcp, year_val, subsidence, riverbed)
     try:
-        item = sal_incr_collection.get_item(item_id)
-        visual_asset = item.assets.get("visual")
-        url = visual_asset.href
-        layer = visual_asset.title
+        visual_asset = get_item_assets(item_id)["visual"]
+        url = visual_asset["href"]
+        layer = visual_asset["title"]
         legend_url = _make_legend_url(url, layer) if url and layer else None
         config = {
             "url": url,
@@ -201,13 +524,10 @@ def get_baseline_salinity_wms_config(year_val):
 def get_isoline_gdf(rcp, year_val, subsidence, riverbed):
     item_id = _get_item_id(rcp, year_val, subsidence, riverbed)
     try:
-        item = sal_incr_collection.get_item(item_id)
-        vector_asset = item.assets.get("vector")
+        vector_asset = get_item_assets(item_id).get("vector")
         if vector_asset:
-            isoline_url = vector_asset.href.replace('https://storage.googleapis.com/', '')
-            isoline_url = f"gcs://{isoline_url}"
-            isoline = gpd.read_parquet(isoline_url, filesystem=fs)
-            return isoline
+            # Memory / disk cache validated by object generation, downloaded only when changed
+            return get_cached_parquet(_gcs_url(vector_asset["href"]))
     except Exception as e:
         print(f"Error getting isoline for {item_id}: {e}")
     return None
@@ -230,9 +550,46 @@ def _get_impact_col(rcp, subsidence, riverbed):
         id = "baseline"
     return id
 
+def _build_impacts_cache():
+    """Reproject the provinces, merge the production values and write the Arrow cache."""
+    gdf = gpd.read_file(PROVINCES_SHP).to_crs("EPSG:4326")
+    impacts = pd.read_csv(PROVINCES_IMPACTS)
+    merged = gdf.merge(impacts, left_on='Name', right_on='Province', how='left')
+    tmp_path = None
+    try:
+        os.makedirs(os.path.dirname(IMPACTS_CACHE), exist_ok=True)
+        # Unique temporary name: several sessions can rebuild the cache at the same time
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(IMPACTS_CACHE), suffix=".tmp")
+        os.close(fd)
+        merged.to_feather(tmp_path, compression="uncompressed")
+        os.replace(tmp_path, IMPACTS_CACHE)
+    except OSError as e:
+        print(f"Error writing impacts cache: {e}")
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return merged
+
+
+def _read_impacts_gdf():
+    """Provinces with production values, memory-mapped from the Arrow cache when up to date."""
+    sources_mtime = max(os.path.getmtime(PROVINCES_SHP), os.path.getmtime(PROVINCES_IMPACTS))
+    if os.path.exists(IMPACTS_CACHE) and os.path.getmtime(IMPACTS_CACHE) >= sources_mtime:
+        table = feather.read_table(IMPACTS_CACHE, memory_map=True)
+        df = table.drop_columns(["geometry"]).to_pandas()
+        geometry = shapely.from_wkb(table["geometry"].to_numpy(zero_copy_only=False))
+        return gpd.GeoDataFrame(df, geometry=geometry, crs="EPSG:4326")
+    return _build_impacts_cache()
+
+
+def _load_impacts_gdf():
+    """Lazy-load provinces with production values (shared resource "impacts")."""
+    return get_resource("impacts")
+
+
 def get_impact_gdf(rcp, subsidence, riverbed):
     id = _get_impact_col(rcp, subsidence, riverbed)
-    impacts = IMPACTS_GDF[[id, 'geometry']].copy()
+    impacts_gdf = _load_impacts_gdf()
+    impacts = impacts_gdf[[id, 'geometry']].copy()
     if not rcp:
         bins = [0.1, 0.1e3, 0.2e3, 0.5e3, 1.176e3, np.inf]  # in millions USD
         colors = ["#ffffcc", "#a1dab4", "#41b6c4", "#2c7fb8", "#253494"]
@@ -248,8 +605,8 @@ def get_impact_gdf(rcp, subsidence, riverbed):
         impacts = impacts.rename(columns={id: name})
     else:
         impacts["value"] = np.where(
-            IMPACTS_GDF["baseline"] != 0,
-            (impacts[id] - IMPACTS_GDF["baseline"]) / IMPACTS_GDF["baseline"] * -100,
+            impacts_gdf["baseline"] != 0,
+            (impacts[id] - impacts_gdf["baseline"]) / impacts_gdf["baseline"] * -100,
             0
         )        
         bins = [0, 5, 10, 20, 40, np.inf]  # in percentage
@@ -283,7 +640,7 @@ def resolve_crop_parquet_path(preferred=None):
 
 
 def _load_crop_productivity_gdf():
-    """Lazy-load crop productivity GDF (mirrors IMPACTS_GDF for rice production)."""
+    """Lazy-load crop productivity GDF (mirrors _load_impacts_gdf for rice production)."""
     global _CROP_GDF
     if _CROP_GDF is None:
         src = resolve_crop_parquet_path()
@@ -1,5 +1,47 @@
 import leafmap as leafmap
 # import leafmap.maplibregl as leafmap
+import shapely
+import threading
+from collections import OrderedDict
+
+# Levels of detail of line layers (isolines): up to each zoom the geometry is simplified to
+# about one screen pixel at that zoom; above the last level the full geometry is shown
+LOD_ZOOMS = [6, 8, 10, 12]
+# Degrees per screen pixel at zoom 0 (the 360 degrees of longitude over one 256 px web tile)
+DEGREES_PER_PIXEL = 360 / 256
+# Levels of detail kept for the most recent GeoDataFrames (the isoline cache returns the same objects)
+LOD_CACHE_SIZE = 16
+_LODS = OrderedDict()  # id(gdf) -> (gdf, levels of detail)
+# The page and the prefetch threads (utils.prefetch) both use _LODS
+_LODS_LOCK = threading.Lock()
+
+
+def build_lods(gdf):
+    """[(max zoom, GeoDataFrame)] with topology-preserving simplified geometries, coarse to fine."""
+    with _LODS_LOCK:
+        entry = _LODS.get(id(gdf))
+        if entry is not None and entry[0] is gdf:
+            _LODS.move_to_end(id(gdf))
+            return entry[1]
+    lods = []
+    for zoom in LOD_ZOOMS:
+        simplified = gdf.copy()
+        simplified["geometry"] = shapely.simplify(gdf.geometry.values, DEGREES_PER_PIXEL / 2 ** zoom, preserve_topology=True)
+        lods.append((zoom, simplified))
+    lods.append((None, gdf))
+    with _LODS_LOCK:
+        # The entry holds a reference to gdf, so its id cannot be reused while cached
+        _LODS[id(gdf)] = (gdf, lods)
+        _LODS.move_to_end(id(gdf))
+        while len(_LODS) > LOD_CACHE_SIZE:
+            _LODS.popitem(last=False)
+    return lods
+
+
+def lod_level(lods, zoom):
+    """Index of the level of detail to show at `zoom`."""
+    return next((i for i, (max_zoom, _) in enumerate(lods) if max_zoom is not None and zoom <= max_zoom), len(lods) - 1)
+
 
 class Map(leafmap.Map):
     def __init__(self, **kwargs):
@@ -7,7 +49,10 @@ class Map(leafmap.Map):
         self.add_basemap("Esri.WorldImagery")
         self._current_wms_layers = []  # Store names, not objects
         self._current_gdf_layers = []
+        self._gdf_lods = {}  # layer name -> (levels of detail, shown level, add_gdf arguments)
         self.legend_url = None
+        # Swap the level of detail of line layers when the user zooms
+        self.observe(self._on_zoom, names="zoom")
 
     def add_wms_layer_general(self, config, layer_name=None, opacity_value=0.8):
         """
@@ -32,28 +77,45 @@ class Map(leafmap.Map):
             self._current_wms_layers = []
             self.legend_url = None
 
-    def add_gdf_layer_general(self, gdf, layer_name="GDF Layer", style=None, hover_style=None, info_mode=None):
+    def add_gdf_layer_general(self, gdf, layer_name="GDF Layer", style=None, hover_style=None, info_mode=None, lod=False):
         """
         Add a GeoDataFrame layer in a general way.
+
+        With `lod` (for line layers such as the isolines) simplified versions of
+        the geometry are precomputed (see build_lods); the one matching the
+        current zoom is sent to the map and swapped when the zoom changes.
         """
         self.clear_gdf_layers()
         if gdf is not None:
-            self.add_gdf(
-                gdf,
-                layer_name=layer_name,
-                info_mode=info_mode,
-                style=style,
-                hover_style=hover_style
-            )
+            kwargs = {"layer_name": layer_name, "info_mode": info_mode, "style": style, "hover_style": hover_style}
+            if lod:
+                lods = build_lods(gdf)
+                level = lod_level(lods, self.zoom)
+                self._gdf_lods[layer_name] = (lods, level, kwargs)
+                gdf = lods[level][1]
+            self.add_gdf(gdf, **kwargs)
             self._current_gdf_layers = [layer_name]
         else:
             self._current_gdf_layers = []
 
+    def _on_zoom(self, change):
+        for layer_name, (lods, level, kwargs) in list(self._gdf_lods.items()):
+            new_level = lod_level(lods, change["new"])
+            if new_level == level:
+                continue
+            for layer in [layer for layer in self.layers if getattr(layer, "name", None) == layer_name]:
+                try:
+                    self.remove_layer(layer)
+                except Exception as e:
+                    print(f"Error removing GDF layer: {e}")
+            self.add_gdf(lods[new_level][1], **kwargs)
+            self._gdf_lods[layer_name] = (lods, new_level, kwargs)
+
     def clear_wms_layers(self):
         if hasattr(self, 'layers') and self.layers:
             layers_to_remove = []
             for layer in self.layers:
-                if hasattr(layer, 'name') and layer.name and 'WMS' in layer.name or (hasattr(layer, 'source') and getattr(layer, 'source', None) == 'wms'):
+                if hasattr(layer, 'name') and layer.name and ('WMS' in layer.name or layer.name in self._current_wms_layers) or (hasattr(layer, 'source') and getattr(layer, 'source', None) == 'wms'):
                     layers_to_remove.append(layer)
             for layer in layers_to_remove:
                 try:
@@ -75,6 +137,7 @@ class Map(leafmap.Map):
                 except Exception as e:
                     print(f"Error removing GDF layer: {e}")
         self._current_gdf_layers = []
+        self._gdf_lods = {}
 
     def set_layer_opacity(self, opacity_value):
         # Set opacity for all current WMS layers by name
@@ -0,0 +1,96 @@
+"""
+Background prefetching of the hazard page selections a user is likely to pick next.
+
+After each map update the WMS config, legend image and (when isolines are
+shown) isoline and its levels of detail are loaded into the caches for the
+neighbouring selections: the adjacent years and the switches that are
+available in the current selection. A bounded thread pool, shared by all
+sessions, does the work. Each session keeps its own Prefetcher: a new selection
+cancels the queued prefetches of that session that are no longer neighbours,
+never those of other sessions.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from solara_mekong.utils.general import YEAR_OPTIONS, get_isoline_gdf, get_legend_image, get_wms_config
+from solara_mekong.utils.map import build_lods
+
+PREFETCH_WORKERS = int(os.getenv("PREFETCH_WORKERS", "4"))
+
+_EXECUTOR = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix="prefetch")
+
+
+def neighbour_selections(rcp, year_val, subsidence, riverbed, show_isoline):
+    """
+    Selections one click away: the previous and next year, the subsidence
+    switch, the riverbed switch (only available with subsidence) and the
+    isoline switch. Selections are (rcp, year, subsidence, riverbed, show_isoline).
+    """
+    year_val = str(year_val)
+    index = YEAR_OPTIONS.index(year_val)
+    neighbours = [
+        (rcp, YEAR_OPTIONS[i], subsidence, riverbed, show_isoline)
+        for i in (index - 1, index + 1)
+        if 0 <= i < len(YEAR_OPTIONS)
+    ]
+    # Switching subsidence off also switches riverbed off
+    neighbours.append((rcp, year_val, not subsidence, riverbed and not subsidence, show_isoline))
+    if subsidence:
+        neighbours.append((rcp, year_val, subsidence, not riverbed, show_isoline))
+    if not show_isoline:
+        neighbours.append((rcp, year_val, subsidence, riverbed, True))
+    return neighbours
+
+
+def warm_selection(selection):
+    """Load the WMS config, legend and isoline (if shown, with its levels of detail) of a selection into the caches."""
+    rcp, year_val, subsidence, riverbed, show_isoline = selection
+    config = get_wms_config(rcp, year_val, subsidence, riverbed)
+    if config is not None and config.get("legend_url"):
+        get_legend_image(config["legend_url"])
+    if show_isoline:
+        isoline_gdf = get_isoline_gdf(rcp, year_val, subsidence, riverbed)
+        if isoline_gdf is not None:
+            build_lods(isoline_gdf)
+
+
+class Prefetcher:
+    """Prefetches submitted by one session."""
+
+    def __init__(self):
+        self._pending = {}  # selection -> future
+        self._lock = threading.Lock()
+
+    def prefetch_neighbours(self, rcp, year_val, subsidence, riverbed, show_isoline):
+        """Queue the neighbours of the current selection and cancel prefetches that went stale."""
+        wanted = neighbour_selections(rcp, year_val, subsidence, riverbed, show_isoline)
+        with self._lock:
+            for selection in [s for s in self._pending if s not in wanted]:
+                # Queued work is dropped; a prefetch already running just finishes filling the cache
+                self._pending.pop(selection).cancel()
+            for selection in wanted:
+                future = self._pending.get(selection)
+                if future is None or future.cancelled():
+                    self._pending[selection] = _EXECUTOR.submit(warm_selection, selection)
+
+    def wait_for(self, selection):
+        """
+        Before loading `selection` itself, wait for its prefetch when one is
+        running (instead of loading it twice); a queued one is cancelled.
+        """
+        with self._lock:
+            future = self._pending.get(selection)
+        if future is None or future.cancel():
+            return
+        try:
+            future.result()
+        except Exception as e:
+            print(f"Error prefetching {selection}: {e}")
+
+    def cancel(self):
+        """Cancel the queued prefetches of the session and forget all of them."""
+        with self._lock:
+            for future in self._pending.values():
+                future.cancel()
+            self._pending = {}